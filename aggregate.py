@@ -0,0 +1,128 @@
+import heapq
+import json
+import math
+import sys
+from collections import OrderedDict
+
+import render
+import utils
+from enums import Colors, Formats
+from writers import STREAMING_FORMATS, RecordWriter
+
+STARS_WEIGHT = 0.25
+LISTS_WEIGHT = 0.5
+FIELDS = ("rank", "score", "lists", "languages", "best_rank", "stars", "stars_gained", "description", "url")
+
+
+def get_score(entry):
+    """
+    Combine the appearances of an entry into a single score.
+    Each list contributes the reciprocal of the entry's rank in it, every list beyond the first adds a bonus,
+    and the largest number of stars gained adds a logarithmic term so it informs but does not dominate the ranking.
+    :param entry: merged entry
+    :return: score
+    """
+    return (entry["reciprocal_rank"]
+            + LISTS_WEIGHT * (entry["lists"] - 1)
+            + STARS_WEIGHT * math.log10(1 + entry["stars_gained"]))
+
+
+def merge(results):
+    """
+    Merge parsed results from several lists, deduplicating entries by their key
+    :param results: iterable of parsed Trends objects
+    :return: dict of key to merged entry
+    """
+    merged = {}
+    for trends in results:
+        list_name = trends.language or "all"
+        for key, value in trends.trending.items():
+            stars_gained = utils.parse_count(value.get("stars_gained", "")) or 0
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {
+                    "reciprocal_rank": 1.0 / value["rank"],
+                    "lists": 1,
+                    "languages": [list_name],
+                    "best_rank": value["rank"],
+                    "stars": value.get("stars", ""),
+                    "stars_gained": stars_gained,
+                    "description": value.get("description", ""),
+                    "url": value.get("url", "")
+                }
+                continue
+            entry["reciprocal_rank"] += 1.0 / value["rank"]
+            entry["lists"] += 1
+            entry["languages"].append(list_name)
+            entry["best_rank"] = min(entry["best_rank"], value["rank"])
+            entry["stars_gained"] = max(entry["stars_gained"], stars_gained)
+    return merged
+
+
+def top_k(results, k=25):
+    """
+    Rank the deduplicated entries of several lists globally, keeping the k best with a heap
+    :param results: iterable of parsed Trends objects
+    :param k: number of entries to keep
+    :return: OrderedDict of key to entry, best first
+    """
+    merged = merge(results)
+    best = heapq.nlargest(k, ((get_score(entry), key) for key, entry in merged.items()))
+
+    ranked = OrderedDict()
+    for index, (score, key) in enumerate(best):
+        entry = merged[key]
+        ranked[key] = {
+            "rank": index + 1,
+            "score": round(score, 4),
+            "lists": entry["lists"],
+            "languages": entry["languages"],
+            "best_rank": entry["best_rank"],
+            "stars": entry["stars"],
+            "stars_gained": entry["stars_gained"],
+            "description": entry["description"],
+            "url": entry["url"]
+        }
+    return ranked
+
+
+def print_top_k(ranked, format_="default", key_field="repository", out=None):
+    """
+    Print a global ranking in the requested output format
+    :param ranked: ranking returned by top_k
+    :param format_: output format to use
+    :param key_field: name of the key column
+    :param out: text stream to write to, defaults to the current sys.stdout
+    :return:
+    """
+    out = out or sys.stdout
+    if format_ == Formats.DEFAULT:
+        colors = render.use_colors(out)
+        lines = []
+        for key, value in ranked.items():
+            lines.append("➜ {} [score {}, in {} list(s): {}]:  {}".format(
+                render.colorize(key, Colors.GREEN, colors),
+                value["score"],
+                value["lists"],
+                render.colorize(", ".join(value["languages"]), Colors.BLUE, colors),
+                render.colorize(value["description"] or "<Unknown Description>", Colors.RED, colors)))
+        if lines:
+            render.write("\n".join(lines), out)
+    elif format_ == Formats.JSON:
+        print(json.dumps(ranked, indent=4), file=out)
+    elif format_ == Formats.JSON_COMPACT:
+        print(json.dumps(ranked, separators=(",", ":")), file=out)
+    elif format_ in STREAMING_FORMATS:
+        writer = RecordWriter(format_, out, [key_field] + list(FIELDS))
+        for key, value in ranked.items():
+            record = {key_field: key}
+            record.update(value, languages=" ".join(value["languages"]) if format_ == Formats.CSV else value["languages"])
+            writer.write(record)
+        writer.flush()
+    elif format_ == Formats.TABLE:
+        rows = [[value["rank"], key, value["score"], ", ".join(value["languages"]), value["stars_gained"], value["url"]]
+                for key, value in ranked.items()]
+        render.write(render.render_table(["Rank", key_field.capitalize(), "Score", "Lists", "Stars Gained", "URL"], rows),
+                     out)
+    else:
+        print("Unknown format", file=out)
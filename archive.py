@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from enums import ArchiveModes
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BODY_SUFFIXES = (".html.zst", ".html.gz", ".html")
+
+
+def compress(body, suffix):
+    """
+    Compress a page body for storage
+    :param body: raw bytes of the page
+    :param suffix: file suffix naming the compression to use
+    :return: compressed bytes
+    """
+    if suffix == ".html.zst":
+        return zstandard.ZstdCompressor(level=10).compress(body)
+    if suffix == ".html.gz":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def decompress(data, suffix):
+    """
+    Decompress a stored page body
+    :param data: bytes read from the body file
+    :param suffix: file suffix naming the compression used
+    :return: raw bytes of the page
+    """
+    if suffix == ".html.zst":
+        if zstandard is None:
+            print("ERROR: zstandard is required to read this archive. Install it using: pip install git-trend[compression]")
+            exit(1)
+        return zstandard.ZstdDecompressor().decompress(data)
+    if suffix == ".html.gz":
+        return gzip.decompress(data)
+    return data
+
+
+class PageArchive:
+    def __init__(self, directory, mode=ArchiveModes.RECORD):
+        """
+        Directory of raw trending pages, recorded from live fetches or replayed without network access.
+        Bodies are stored zstd compressed when the zstandard package is installed and gzip compressed otherwise.
+        :param directory: Directory holding the recorded pages
+        :param mode: Whether pages are recorded to or replayed from the directory
+        """
+        self.directory = directory
+        self.mode = mode
+
+    def get_base_path(self, url):
+        """
+        Get the path, without suffix, of the files recorded for a URL
+        :param url: URL of the trending page
+        :return: path prefix
+        """
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def get_paths(self, url):
+        """
+        Get the files holding the body and the metadata recorded for a URL.
+        For an existing recording the body is whichever compressed or uncompressed file is present.
+        :param url: URL of the trending page
+        :return: tuple of body path and metadata path
+        """
+        base = self.get_base_path(url)
+        for suffix in BODY_SUFFIXES:
+            if os.path.exists(base + suffix):
+                return base + suffix, "{}.json".format(base)
+        return base + self.get_body_suffix(), "{}.json".format(base)
+
+    @staticmethod
+    def get_body_suffix():
+        """
+        Get the suffix of newly recorded bodies, which names their compression
+        :return: file suffix
+        """
+        return ".html.zst" if zstandard is not None else ".html.gz"
+
+    def save(self, url, response):
+        """
+        Record the raw body, status code and headers of a response
+        :param url: URL that was requested
+        :param response: requests Response for the URL
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        base = self.get_base_path(url)
+        suffix = self.get_body_suffix()
+        for stale_suffix in BODY_SUFFIXES:
+            if stale_suffix != suffix and os.path.exists(base + stale_suffix):
+                os.remove(base + stale_suffix)
+        with open(base + suffix, "wb") as f:
+            f.write(compress(response.content, suffix))
+        meta_path = "{}.json".format(base)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "url": url,
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+                "encoding": response.encoding,
+                "fetched_at": time.time()
+            }, f, indent=4)
+
+    def load(self, url):
+        """
+        Get the recorded page for a URL as raw bytes, along with the encoding and status code it was served with
+        :param url: URL of the trending page
+        :return: tuple of page body, encoding, which is None when the server did not declare one, and status code
+        """
+        body_path, meta_path = self.get_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise KeyError(url)
+        suffix = next(suffix for suffix in BODY_SUFFIXES if body_path.endswith(suffix))
+        return decompress(data, suffix), meta.get("encoding"), meta.get("status_code", 200)
+
+    def get_recorded(self):
+        """
+        Get the metadata of every recorded page, for reprocessing an archive in bulk
+        :return: list of metadata dicts ordered by fetch time
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    entries.append(json.load(f))
+        return sorted(entries, key=lambda entry: entry["fetched_at"])
@@ -0,0 +1,115 @@
+import importlib.util
+
+import pytest
+from bs4 import BeautifulSoup, SoupStrainer
+
+from conftest import CorpusPage, get_corpus_pages
+from enums import ContentTypes, Formats
+from trending import Developers, Repositories, Trends
+
+PARSER_BACKENDS = [
+    backend for backend, module in [("html.parser", None), ("lxml", "lxml"), ("html5lib", "html5lib")]
+    if module is None or importlib.util.find_spec(module) is not None
+]
+
+CLASSES = {
+    ContentTypes.REPOSITORIES: Repositories,
+    ContentTypes.DEVELOPERS: Developers,
+}
+
+ARTICLE_CLASSES = {
+    ContentTypes.REPOSITORIES: "Box-row",
+    ContentTypes.DEVELOPERS: "Box-row d-flex",
+}
+
+
+def make_unparsed(page):
+    """
+    Build a Trends object for a corpus page without running the constructor's fetch and validation,
+    so that empty pages can be benchmarked as well
+    """
+    Trends.page_memo.clear()
+    cls = CLASSES[page.content_type]
+    trends = cls.__new__(cls)
+    Trends.__init__(trends, content_type=page.content_type, period="daily", archive=page)
+    return trends
+
+
+def make_parsed(page):
+    Trends.page_memo.clear()
+    return CLASSES[page.content_type](period="daily", archive=page)
+
+
+@pytest.mark.parametrize("backend", PARSER_BACKENDS)
+@pytest.mark.parametrize("name", get_corpus_pages())
+def bench_get_github_soup(stage, name, backend):
+    trends = make_unparsed(CorpusPage(name))
+    trends.html_parser = backend
+    stage(trends.get_github_soup)
+
+
+@pytest.mark.parametrize("name", get_corpus_pages())
+def bench_parse_content(stage, name):
+    stage(make_unparsed(CorpusPage(name)).parse_content)
+
+
+def parse_cold(trends):
+    """
+    Parse without reusing items extracted by earlier rounds, as on the first poll of a page
+    """
+    Trends.item_memo.clear()
+    trends.parse()
+
+
+@pytest.mark.parametrize("memo", ["cold", "warm"])
+@pytest.mark.parametrize("name", get_corpus_pages(ContentTypes.REPOSITORIES, include_empty=False))
+def bench_repositories_parse(stage, name, memo):
+    trends = make_parsed(CorpusPage(name))
+    if memo == "cold":
+        stage(parse_cold, trends)
+    else:
+        stage(trends.parse)
+
+
+@pytest.mark.parametrize("memo", ["cold", "warm"])
+@pytest.mark.parametrize("name", get_corpus_pages(ContentTypes.DEVELOPERS, include_empty=False))
+def bench_developers_parse(stage, name, memo):
+    trends = make_parsed(CorpusPage(name))
+    if memo == "cold":
+        stage(parse_cold, trends)
+    else:
+        stage(trends.parse)
+
+
+@pytest.mark.parametrize("name", get_corpus_pages(include_empty=False))
+def bench_unchanged_page(stage, name):
+    """
+    Fetch and hash a page identical to the one parsed last, which skips parsing altogether
+    """
+    page = CorpusPage(name)
+    make_parsed(page).parse()
+    stage(lambda: CLASSES[page.content_type](period="daily", archive=page).parse())
+
+
+@pytest.mark.parametrize("format_", [e.value for e in Formats if e != Formats.PARQUET])
+@pytest.mark.parametrize("name", get_corpus_pages(include_empty=False))
+def bench_print(stage, name, format_):
+    trends = make_parsed(CorpusPage(name))
+    trends.parse()
+    stage(trends.print, format_=format_)
+
+
+EXTRACTORS = {
+    "find_all": lambda html, cls: BeautifulSoup(html, "html.parser").find("main").find_all("article", class_=cls),
+    "select": lambda html, cls: BeautifulSoup(html, "html.parser").select(
+        "main article.{}".format(cls.replace(" ", "."))),
+    "strainer": lambda html, cls: BeautifulSoup(
+        html, "html.parser", parse_only=SoupStrainer("article", class_=cls)).find_all("article", class_=cls),
+}
+
+
+@pytest.mark.parametrize("extractor", sorted(EXTRACTORS))
+@pytest.mark.parametrize("name", get_corpus_pages(include_empty=False))
+def bench_extractor(stage, name, extractor):
+    page = CorpusPage(name)
+    stage(EXTRACTORS[extractor], page.content, ARTICLE_CLASSES[page.content_type])
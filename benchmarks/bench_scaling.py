@@ -0,0 +1,35 @@
+import pytest
+
+from enums import ContentTypes
+from synthetic import SyntheticPage
+from trending import Developers, Repositories, Trends
+
+CLASSES = {
+    ContentTypes.REPOSITORIES: Repositories,
+    ContentTypes.DEVELOPERS: Developers,
+}
+
+SIZES = [100, 1000]
+
+
+def parse_cold(page):
+    """
+    Build and parse a synthetic page from scratch, without reusing earlier results
+    """
+    Trends.page_memo.clear()
+    Trends.item_memo.clear()
+    CLASSES[page.content_type](period="daily", archive=page).parse()
+
+
+@pytest.mark.parametrize("items", SIZES)
+@pytest.mark.parametrize("content_type", list(ContentTypes), ids=lambda content_type: content_type.value)
+def bench_synthetic_parse(stage, content_type, items):
+    stage(parse_cold, SyntheticPage(content_type, items))
+
+
+@pytest.mark.parametrize("format_", ["table", "json", "csv"])
+@pytest.mark.parametrize("items", SIZES)
+def bench_synthetic_print(stage, items, format_):
+    trends = Repositories(period="daily", archive=SyntheticPage(ContentTypes.REPOSITORIES, items))
+    trends.parse()
+    stage(trends.print, format_=format_)
@@ -0,0 +1,54 @@
+import time
+
+from cache import ResultCache
+from planner import SweepPlanner
+from polling import PollSchedule
+from trending import Repositories
+from utils import get_supported_languages
+
+HOUR = 3600
+
+
+def get_sweep(count):
+    """
+    Build a sweep of repository queries across languages and periods
+    :param count: number of queries
+    :return: list of (query text, Trends subclass, query arguments) tuples
+    """
+    languages = get_supported_languages()
+    periods = ["daily", "weekly", "monthly"]
+    return [(None, Repositories, {"period": periods[index % 3], "language": languages[index % len(languages)],
+                                  "spoken_language": None})
+            for index in range(count)]
+
+
+def bench_planner_plan(benchmark, tmp_path):
+    cache = ResultCache(directory=str(tmp_path), ttl=600)
+    planner = SweepPlanner(cache, budget=100)
+    jobs = get_sweep(1000)
+    for index, (_, trends_class, query) in enumerate(jobs):
+        url = trends_class.build_url(**query)
+        if index % 2:
+            cache.write_entry(url, {"url": url, "fetched_at": time.time() - (index % 48) * HOUR, "digest": None,
+                                    "trending": {}})
+        for check in range(index % 5):
+            planner.record_check(url, changed=check % 2 == 0)
+        if index % 7 == 0:
+            planner.record_request(url)
+
+    benchmark(planner.plan, jobs)
+
+
+def bench_polling_record(benchmark):
+    urls = ["https://github.com/trending/{}".format(language) for language in get_supported_languages()]
+    ranked = ["owner/repo{}".format(index) for index in range(25)]
+    keys = [ranked, ranked[::-1]]
+
+    def run():
+        schedule = PollSchedule(min_interval=100, max_interval=6 * HOUR)
+        for poll in range(24):
+            for index, url in enumerate(urls):
+                schedule.record(url, keys[(poll * index) % 2], now=poll * HOUR)
+        return schedule
+
+    benchmark(run)
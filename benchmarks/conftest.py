@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enums import ArchiveModes, ContentTypes  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+class CorpusPage:
+    mode = ArchiveModes.REPLAY
+
+    def __init__(self, name):
+        """
+        Stand-in for PageArchive that replays a single corpus page for every URL
+        :param name: File name of the page in the corpus directory
+        """
+        self.name = name
+        with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+            self.content = f.read()
+
+    def load(self, url):
+        return self.content, "utf-8", 200
+
+    @property
+    def content_type(self):
+        if self.name.startswith(ContentTypes.DEVELOPERS.value):
+            return ContentTypes.DEVELOPERS
+        return ContentTypes.REPOSITORIES
+
+    @property
+    def is_empty(self):
+        return "_empty" in self.name
+
+
+def get_corpus_pages(content_type=None, include_empty=True):
+    """
+    Get the names of corpus pages, optionally restricted to a content type
+    :param content_type: Only return pages of this ContentTypes value
+    :param include_empty: Whether to include pages without any trending items
+    :return: sorted list of file names
+    """
+    names = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if content_type is not None and not name.startswith(content_type.value):
+            continue
+        if not include_empty and "_empty" in name:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.fixture
+def stage(benchmark):
+    """
+    Benchmark a stage and record its peak traced memory alongside the timings.
+    Memory is measured in a separate untimed run so tracemalloc does not skew the timings.
+    """
+
+    def run(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            with redirect_stdout(io.StringIO()):
+                func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory_bytes"] = peak
+
+        def timed():
+            with redirect_stdout(io.StringIO()):
+                return func(*args, **kwargs)
+
+        return benchmark(timed)
+
+    return run
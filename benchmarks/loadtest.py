@@ -0,0 +1,199 @@
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standin  # noqa: E402
+import trend_client  # noqa: E402
+import trend_daemon  # noqa: E402
+from fetcher import Fetcher  # noqa: E402
+from trending import Developers, Repositories, Trends  # noqa: E402
+from writers import RecordWriter  # noqa: E402
+
+LANGUAGES = ["python", "rust", "go", "javascript", "typescript", "java", "c", "c%2B%2B", "ruby", "swift"]
+PERIODS = ["daily", "weekly", "monthly"]
+
+
+def get_queries(count, base_url):
+    """
+    Build a mix of repository and developer queries across languages and periods
+    :param count: number of queries
+    :param base_url: site to get the pages from
+    :return: list of (Trends subclass, query) tuples
+    """
+    queries = []
+    for index in range(count):
+        trends_class = Developers if index % 4 == 3 else Repositories
+        language = LANGUAGES[index % len(LANGUAGES)] if index % 5 else None
+        queries.append((trends_class, {"period": PERIODS[index % len(PERIODS)], "language": language,
+                                       "base_url": base_url}))
+    return queries
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    return samples[max(math.ceil(fraction * len(samples)) - 1, 0)]
+
+
+def run_bulk(queries, concurrency, fetcher, warm=False):
+    """
+    Fetch, parse and render every query in this process, as runs across many languages do
+    :param queries: list of (Trends subclass, query) tuples
+    :param concurrency: number of queries in flight at once
+    :param fetcher: Fetcher shared by every query
+    :param warm: keep reusing results and items of unchanged pages, instead of parsing every page from scratch
+    :return: list of (seconds, outcome) tuples
+    """
+
+    def run_one(trends_class, query):
+        if not warm:
+            Trends.page_memo.clear()
+            Trends.item_memo.clear()
+        start = time.perf_counter()
+        try:
+            trends = trends_class(fetcher=fetcher, **query)
+            trends.stream(RecordWriter("ndjson", io.StringIO(), trends_class.get_fieldnames()))
+            outcome = "empty" if trends.empty else "ok"
+        except (Exception, SystemExit):
+            outcome = "error"
+        return time.perf_counter() - start, outcome
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_one, trends_class, query) for trends_class, query in queries]
+        return [future.result() for future in futures]
+
+
+def get_argv(trends_class, query):
+    """
+    Build the command line the CLI would forward to the daemon for a query
+    :param trends_class: Trends subclass of the query
+    :param query: arguments of the query
+    :return: list of arguments, without the program name
+    """
+    argv = ["--repos" if trends_class is Repositories else "--devs", "--period", query["period"],
+            "--format", "ndjson", "--base-url", query["base_url"]]
+    if query["language"]:
+        argv.extend(["--language", query["language"]])
+    return argv
+
+
+def run_daemon(queries, concurrency, path):
+    """
+    Send every query to a daemon over its Unix socket from concurrent clients, as interactive CLI runs do when a
+    daemon is running
+    :param queries: list of (Trends subclass, query) tuples
+    :param concurrency: number of clients with a query in flight at once
+    :param path: Unix socket of the daemon
+    :return: list of (seconds, outcome) tuples
+    """
+
+    def run_one(trends_class, query):
+        start = time.perf_counter()
+        reply = trend_client.forward(get_argv(trends_class, query), path=path)
+        if reply is None:
+            outcome = "unreachable"
+        elif reply["code"] == 0:
+            outcome = "ok"
+        elif "There were no trending" in reply["stdout"]:
+            outcome = "empty"
+        else:
+            outcome = "error"
+        return time.perf_counter() - start, outcome
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_one, trends_class, query) for trends_class, query in queries]
+        return [future.result() for future in futures]
+
+
+def start_daemon():
+    """
+    Run a daemon on a temporary socket from a background thread
+    :return: the running daemon, which can be stopped with stop_daemon()
+    """
+    daemon = trend_daemon.Daemon(os.path.join(tempfile.mkdtemp(prefix="git-trend-loadtest-"), "daemon.sock"))
+    threading.Thread(target=daemon.serve_forever, name="git-trend-daemon", daemon=True).start()
+    return daemon
+
+
+def stop_daemon(daemon):
+    daemon.shutdown()
+    daemon.server_close()
+    shutil.rmtree(os.path.dirname(daemon.path), ignore_errors=True)
+
+
+def report(results, elapsed, server=None):
+    """
+    Print throughput, latency percentiles and outcomes of a load test
+    :param results: list of (seconds, outcome) tuples
+    :param elapsed: wall clock seconds of the whole run
+    :param server: stand-in server the run was made against, if it was started by the driver
+    :return:
+    """
+    latencies = sorted(seconds for seconds, outcome in results if outcome == "ok")
+    outcomes = Counter(outcome for _, outcome in results)
+    print("{:<12} {}".format("queries", len(results)))
+    print("{:<12} {:.2f}/s".format("throughput", len(results) / elapsed if elapsed else 0.0))
+    for name, fraction in (("p50", 0.50), ("p90", 0.90), ("p95", 0.95), ("p99", 0.99)):
+        print("{:<12} {:.4f}s".format(name, percentile(latencies, fraction)))
+    print("{:<12} {:.4f}s".format("max", latencies[-1] if latencies else 0.0))
+    print("{:<12} {}".format("outcomes", ", ".join("{}={}".format(k, v) for k, v in sorted(outcomes.items()))))
+    if server is not None:
+        print("{:<12} {}".format("requests", server.requests))
+
+
+def main():
+    parser = ArgumentParser(description='Measure throughput and latency of git-trend against a stand-in server')
+    parser.add_argument('--mode', type=str, choices=['bulk', 'daemon'], default='bulk',
+                        help='run queries in this process, or send them to a daemon from concurrent clients')
+    parser.add_argument('--queries', type=int, default=200, help='number of queries to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of queries in flight at once')
+    parser.add_argument('--warm', action='store_true',
+                        help='reuse results of unchanged pages instead of parsing every page from scratch in bulk mode; '
+                             'a daemon always does')
+    parser.add_argument('--base-url', type=str, default=None, metavar='URL',
+                        help='run against an already running server instead of starting a stand-in')
+    parser.add_argument('--hedge', action='store_true', help='hedge slow requests in bulk mode')
+    parser.add_argument('--socket', type=str, default=None, metavar='PATH',
+                        help='send queries to an already running daemon instead of starting one in daemon mode')
+    standin.add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = standin.start_server(**standin.get_server_options(args))
+        base_url = server.url
+
+    queries = get_queries(args.queries, base_url)
+    daemon = None
+    if args.mode == 'daemon' and not args.socket:
+        daemon = start_daemon()
+    start = time.perf_counter()
+    # Pages that fail print their error; keep it out of the report
+    with redirect_stdout(io.StringIO()):
+        if args.mode == 'daemon':
+            results = run_daemon(queries, args.concurrency, args.socket or daemon.path)
+        else:
+            results = run_bulk(queries, args.concurrency, Fetcher(hedge=args.hedge), warm=args.warm)
+    elapsed = time.perf_counter() - start
+
+    report(results, elapsed, server)
+    if daemon is not None:
+        stop_daemon(daemon)
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
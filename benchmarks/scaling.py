@@ -0,0 +1,193 @@
+import csv
+import io
+import os
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import render  # noqa: E402
+from enums import ContentTypes  # noqa: E402
+from synthetic import SyntheticPage  # noqa: E402
+from trending import Developers, Repositories, Trends  # noqa: E402
+
+CLASSES = {
+    ContentTypes.REPOSITORIES: Repositories,
+    ContentTypes.DEVELOPERS: Developers,
+}
+
+FORMATS = ["default", "table", "json", "ndjson", "csv"]
+SPAN_STAGES = ("soup", "parse_content", "find_all", "parse")
+
+
+def run_pipeline(page, formats):
+    """
+    Parse a page from scratch and print it in every format
+    :param page: SyntheticPage to replay
+    :param formats: output formats to print
+    :return: dict of stage name to seconds
+    """
+    Trends.page_memo.clear()
+    Trends.item_memo.clear()
+    trends = CLASSES[page.content_type](period="daily", archive=page)
+    trends.parse()
+    seconds = {span["stage"]: span["seconds"] for span in trends.profile.spans if span["stage"] in SPAN_STAGES}
+    for format_ in formats:
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            trends.print(format_=format_)
+            seconds["print:{}".format(format_)] = time.perf_counter() - start
+    return seconds
+
+
+def measure_memory(page, formats):
+    """
+    Get the peak traced memory of every stage, from a separate run so tracing does not skew the timings
+    :param page: SyntheticPage to replay
+    :param formats: output formats to print
+    :return: dict of stage name to peak bytes
+    """
+    Trends.page_memo.clear()
+    Trends.item_memo.clear()
+    peaks = {}
+    tracemalloc.start()
+    try:
+        trends = CLASSES[page.content_type](period="daily", archive=page)
+        peaks["construct"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        trends.parse()
+        peaks["parse"] = tracemalloc.get_traced_memory()[1]
+        for format_ in formats:
+            tracemalloc.reset_peak()
+            with redirect_stdout(io.StringIO()):
+                trends.print(format_=format_)
+            peaks["print:{}".format(format_)] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def measure(content_type, sizes, formats, repeat):
+    """
+    Time and trace every stage for pages of increasing size
+    :param content_type: ContentTypes value of the pages
+    :param sizes: numbers of articles
+    :param formats: output formats to print
+    :param repeat: timing runs per size, the fastest is kept
+    :return: list of result dicts with content_type, items, stage, seconds and peak_bytes
+    """
+    results = []
+    for items in sizes:
+        page = SyntheticPage(content_type, items)
+        runs = [run_pipeline(page, formats) for _ in range(repeat)]
+        peaks = measure_memory(page, formats)
+        for stage in runs[0]:
+            results.append({
+                "content_type": content_type.value,
+                "items": items,
+                "stage": stage,
+                "seconds": min(run[stage] for run in runs),
+                "peak_bytes": peaks.get(stage, peaks["construct"] if stage in SPAN_STAGES[:3] else None),
+            })
+    return results
+
+
+def get_growth(results):
+    """
+    Compare the time per item of every stage at the largest size with the smallest one.
+    A stage that scales linearly stays close to 1; quadratic work grows with the ratio of the sizes.
+    :param results: list of result dicts from measure
+    :return: dict of (content_type, stage) to growth factor
+    """
+    by_stage = {}
+    for result in results:
+        by_stage.setdefault((result["content_type"], result["stage"]), []).append(result)
+    growth = {}
+    for key, rows in by_stage.items():
+        rows.sort(key=lambda row: row["items"])
+        first, last = rows[0], rows[-1]
+        if first["seconds"] and first["items"] != last["items"]:
+            growth[key] = (last["seconds"] / last["items"]) / (first["seconds"] / first["items"])
+    return growth
+
+
+def plot(results, path):
+    """
+    Plot time and peak memory against the number of articles, one line per stage, on log-log axes
+    :param results: list of result dicts from measure
+    :param path: image file to write
+    :return:
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("ERROR: matplotlib is required for --plot. Install it using: pip install matplotlib")
+        exit(1)
+
+    content_types = sorted({result["content_type"] for result in results})
+    figure, axes = plt.subplots(len(content_types), 2, figsize=(12, 5 * len(content_types)), squeeze=False)
+    for row, content_type in enumerate(content_types):
+        stages = []
+        for result in results:
+            if result["content_type"] == content_type and result["stage"] not in stages:
+                stages.append(result["stage"])
+        for stage in stages:
+            rows = [r for r in results if r["content_type"] == content_type and r["stage"] == stage]
+            sizes = [r["items"] for r in rows]
+            axes[row][0].plot(sizes, [r["seconds"] for r in rows], marker="o", label=stage)
+            if all(r["peak_bytes"] is not None for r in rows):
+                axes[row][1].plot(sizes, [r["peak_bytes"] / 2 ** 20 for r in rows], marker="o", label=stage)
+        for column, label in enumerate(("seconds", "peak MiB")):
+            axes[row][column].set_xscale("log")
+            axes[row][column].set_yscale("log")
+            axes[row][column].set_xlabel("articles")
+            axes[row][column].set_ylabel(label)
+            axes[row][column].set_title("{} {}".format(content_type, label))
+            axes[row][column].legend(fontsize="small")
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def main():
+    parser = ArgumentParser(description='Measure how parse and print time and memory grow with the number of articles')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25, 250, 2500, 25000],
+                        help='numbers of articles per page')
+    parser.add_argument('--content-type', type=str, choices=[e.value for e in ContentTypes], default=None,
+                        help='only measure repositories or developers pages')
+    parser.add_argument('--formats', type=str, nargs='+', choices=FORMATS, default=FORMATS,
+                        help='output formats to print')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per size, the fastest is kept')
+    parser.add_argument('--csv', type=str, default=None, metavar='FILE', help='write the measurements to a CSV file')
+    parser.add_argument('--plot', type=str, default=None, metavar='FILE', help='plot the measurements to an image')
+    args = parser.parse_args()
+
+    content_types = [ContentTypes(args.content_type)] if args.content_type else list(ContentTypes)
+    results = []
+    for content_type in content_types:
+        results.extend(measure(content_type, sorted(args.sizes), args.formats, args.repeat))
+
+    growth = get_growth(results)
+    rows = [[r["content_type"], r["items"], r["stage"], "{:.4f}".format(r["seconds"]),
+             "{:.2f}".format(r["seconds"] / r["items"] * 1e6),
+             "" if r["peak_bytes"] is None else "{:.1f}".format(r["peak_bytes"] / 2 ** 20),
+             "{:.2f}".format(growth.get((r["content_type"], r["stage"]), 1.0))]
+            for r in results]
+    render.write(render.render_table(
+        ["Content", "Items", "Stage", "Seconds", "us/item", "Peak MiB", "Growth"], rows))
+
+    if args.csv:
+        with open(args.csv, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["content_type", "items", "stage", "seconds", "peak_bytes"])
+            writer.writeheader()
+            writer.writerows(results)
+    if args.plot:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
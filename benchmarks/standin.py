@@ -0,0 +1,262 @@
+import gzip
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+ARTICLE_CLASSES = {
+    "repositories": "Box-row",
+    "developers": "Box-row d-flex",
+    "empty": "Box-row",
+}
+
+PAGES = {
+    "repositories": "repositories_full.html",
+    "developers": "developers_full.html",
+    "empty": "repositories_empty.html",
+}
+
+
+class Page:
+    def __init__(self, body):
+        """
+        Body of a stand-in page with its precomputed gzip encoding and ETag
+        :param body: raw bytes of the page
+        """
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        self.etag = '"{}"'.format(hashlib.blake2b(body, digest_size=8).hexdigest())
+
+
+def rotate(body, class_name, shift):
+    """
+    Move the first articles of a page to the end, so the page looks like a regenerated trending list
+    :param body: raw bytes of the page
+    :param class_name: class of the trending articles
+    :param shift: number of articles to move
+    :return: raw bytes of the rotated page
+    """
+    articles = utils.get_article_slices(body, class_name)
+    if not articles:
+        return body
+    start = body.index(articles[0])
+    end = body.rindex(articles[-1]) + len(articles[-1])
+    shift %= len(articles)
+    return body[:start] + b"\n".join(articles[shift:] + articles[:shift]) + body[end:]
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, empty_rate=0.0, etag=True,
+                 pages=None, change_interval=0.0, seed=None):
+        """
+        Local stand-in for github.com that serves saved trending pages for every URL Trends.get_url can produce:
+        /trending, /trending/<language>, /trending/developers and /trending/developers/<language>,
+        with any since and spoken_language_code parameters.
+        :param address: tuple of host and port to listen on, port 0 picks a free port
+        :param latency: seconds to wait before answering
+        :param jitter: up to this many seconds are added to or removed from the latency of each response
+        :param error_rate: fraction of requests answered with 500
+        :param throttle_rate: fraction of requests answered with 429 and a Retry-After header
+        :param empty_rate: fraction of URLs that always get the "no trending repositories" page
+        :param etag: whether to send ETags and answer matching If-None-Match headers with 304
+        :param pages: dict of content type ("repositories", "developers" or "empty") to corpus file name
+        :param change_interval: seconds after which every list is regenerated in a different order, 0 to never change
+        :param seed: seed for the random latencies and failures, for reproducible runs
+        """
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.empty_rate = empty_rate
+        self.etag = etag
+        self.change_interval = change_interval
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.bodies = {}
+        for content_type, name in dict(PAGES, **(pages or {})).items():
+            with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+                self.bodies[content_type] = f.read()
+        self.pages = {}
+        self.requests = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def get_page(self, content_type):
+        """
+        Get the page currently served for a content type, regenerated every change_interval seconds
+        :param content_type: "repositories", "developers" or "empty"
+        :return: Page
+        """
+        generation = int(time.time() // self.change_interval) if self.change_interval else 0
+        with self.random_lock:
+            page = self.pages.get((content_type, generation))
+            if page is None:
+                body = self.bodies[content_type]
+                if generation:
+                    body = rotate(body, ARTICLE_CLASSES[content_type], generation)
+                page = Page(body)
+                self.pages = {key: value for key, value in self.pages.items() if key[1] == generation}
+                self.pages[(content_type, generation)] = page
+        return page
+
+    def is_empty(self, path):
+        """
+        Decide from a hash of the path and query whether a URL gets the empty page, so the same URLs stay empty
+        :param path: path and query of the request
+        :return: True if the empty page should be served
+        """
+        digest = hashlib.blake2b(path.encode("utf-8"), digest_size=4).digest()
+        return int.from_bytes(digest, "big") / 2 ** 32 < self.empty_rate
+
+    def draw(self):
+        """
+        Draw the delay and outcome of a response
+        :return: tuple of delay in seconds and status code to force, or None for a normal response
+        """
+        with self.random_lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            outcome = self.random.random()
+        if outcome < self.error_rate:
+            return delay, 500
+        if outcome < self.error_rate + self.throttle_rate:
+            return delay, 429
+        return delay, None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        parts = path.split("/")[1:]
+        if not parts or parts[0] != "trending" or len(parts) > 3:
+            self.send_error(404)
+            return
+        content_type = "developers" if len(parts) > 1 and parts[1] == "developers" else "repositories"
+        if content_type == "repositories" and len(parts) > 2:
+            self.send_error(404)
+            return
+        since = parse_qs(urlsplit(self.path).query).get("since", ["daily"])[0]
+        if since not in ("daily", "weekly", "monthly"):
+            self.send_error(404)
+            return
+
+        delay, status = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        if status == 429:
+            body = b"<html><body><h1>Too many requests</h1></body></html>"
+            self.send_response(429)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if status is not None:
+            self.send_error(status)
+            return
+
+        page = self.server.get_page("empty" if self.server.is_empty(self.path) else content_type)
+        if self.server.etag and self.headers.get("If-None-Match") == page.etag:
+            self.send_response(304)
+            self.send_header("ETag", page.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = page.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = page.gzipped
+            self.send_header("Content-Encoding", "gzip")
+        if self.server.etag:
+            self.send_header("ETag", page.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, address="127.0.0.1", **options):
+    """
+    Run a stand-in server from a background thread
+    :param port: Port to listen on, 0 picks a free port
+    :param address: Address to bind to
+    :param options: latency, jitter, error_rate, throttle_rate, empty_rate, etag, pages, change_interval and seed,
+                    see StandInServer
+    :return: the running server, which can be stopped with shutdown()
+    """
+    server = StandInServer((address, port), **options)
+    threading.Thread(target=server.serve_forever, name="git-trend-standin", daemon=True).start()
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.0, metavar='SECONDS', help='delay before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, metavar='SECONDS',
+                        help='random variation added to or removed from the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--empty-rate', type=float, default=0.0,
+                        help='fraction of URLs that always get the "no trending repositories" page')
+    parser.add_argument('--change-interval', type=float, default=0.0, metavar='SECONDS',
+                        help='regenerate every list in a different order after this many seconds')
+    parser.add_argument('--no-etag', action='store_true', help='do not send ETags or answer with 304')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible latencies and failures')
+
+
+def get_server_options(args):
+    return {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "empty_rate": args.empty_rate,
+        "change_interval": args.change_interval,
+        "etag": not args.no_etag,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Serve saved trending pages locally in place of github.com')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--address', type=str, default='127.0.0.1', help='address to bind to')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandInServer((args.address, args.port), **get_server_options(args))
+    print("Serving trending pages on {}, use: GIT_TREND_BASE_URL={} git-trend --repos".format(server.url, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
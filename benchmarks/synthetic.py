@@ -0,0 +1,220 @@
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from html import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enums import ArchiveModes, ContentTypes  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+TEMPLATES = {
+    ContentTypes.REPOSITORIES: "repositories_full.html",
+    ContentTypes.DEVELOPERS: "developers_full.html",
+}
+
+LANGUAGES = ["Python", "Rust", "Go", "TypeScript", "C++", "Jupyter Notebook", "Emacs Lisp", "F#"]
+
+WORDS = [
+    "fast", "reliable", "tool", "for", "building", "and", "shipping", "software", "at", "scale",
+    "高速", "なデータベース", "分布式", "系统", "빠른", "컴파일러", "résumé", "naïve", "façade", "Ωμέγα",
+    "быстрый", "сервер", "🚀", "✨", "🦀", "<script>", "&amp;", "\"quoted\"",
+]
+
+REPOSITORY_ARTICLE = """              <article class="Box-row">
+      <div class="float-right">
+        <a class="btn btn-sm" href="/login?return_to=%2F{owner}%2F{name}"><svg class="octicon octicon-star mr-1" height="16" width="16"></svg>Star</a>
+      </div>
+      <h1 class="h3 lh-condensed">
+        <a href="/{owner}/{name}">
+          <svg class="octicon octicon-repo mr-1 color-text-secondary" height="16" width="16"></svg>
+          <span data-view-component="true" class="text-normal">
+            {owner} /
+          </span>
+          {name}
+        </a>
+      </h1>
+{description}      <div class="f6 color-text-secondary mt-2">
+{language}        <a class="Link--muted d-inline-block mr-3" href="/{owner}/{name}/stargazers">
+          <svg aria-label="star" class="octicon octicon-star" height="16" width="16"></svg>
+          {stars}
+        </a>
+        <a class="Link--muted d-inline-block mr-3" href="/{owner}/{name}/network/members.{name}">
+          <svg aria-label="fork" class="octicon octicon-repo-forked" height="16" width="16"></svg>
+          {forks}
+        </a>
+        <span class="d-inline-block mr-3">
+          Built by
+          <a class="d-inline-block" href="/{owner}"><img class="avatar mb-1 avatar-user" src="https://avatars.githubusercontent.com/u/1?s=40" width="20" height="20" alt="@{owner}" /></a>
+        </span>
+{stars_gained}      </div>
+    </article>
+"""
+
+REPOSITORY_DESCRIPTION = """      <p class="col-9 color-text-secondary my-1 pr-4">
+        {}
+      </p>
+
+"""
+
+REPOSITORY_LANGUAGE = """        <span class="d-inline-block ml-0 mr-3">
+          <span class="repo-language-color" style="background-color: #3572A5"></span>
+          <span itemprop="programmingLanguage">{}</span>
+        </span>
+"""
+
+REPOSITORY_STARS_GAINED = """        <span class="d-inline-block float-sm-right">
+          <svg class="octicon octicon-star" height="16" width="16"></svg>
+          {} stars today
+        </span>
+"""
+
+DEVELOPER_ARTICLE = """              <article class="Box-row d-flex" id="pa-{user_id}">
+    <a class="color-text-secondary f6 text-center" href="#pa-{user_id}" style="width: 16px;">{rank}</a>
+    <div class="mx-3">
+      <a href="/{user_id}"><img class="rounded avatar-user" src="https://avatars.githubusercontent.com/u/1?s=96" width="48" height="48" alt="@{user_id}" /></a>
+    </div>
+    <div class="d-sm-flex flex-auto">
+      <div class="col-sm-8 d-md-flex">
+        <div class="col-md-6">
+          <h1 class="h3 lh-condensed">
+            <a href="/{user_id}">
+              {name}
+            </a>
+          </h1>
+            <p class="f4 text-normal mb-1">
+              <a class="Link--secondary" href="/{user_id}">{user_id}</a>
+            </p>
+        </div>
+{repository}      </div>
+      <div class="col-sm-4 d-flex flex-sm-justify-end ml-sm-3">
+        <a class="btn btn-sm" href="/login?return_to=%2F{user_id}">Follow</a>
+      </div>
+    </div>
+  </article>
+"""
+
+DEVELOPER_REPOSITORY = """        <div class="col-md-6">
+          <div class="mt-2 mb-3 my-md-0">
+            <article>
+            <div class="f6 color-text-secondary text-uppercase mb-1"><svg class="octicon octicon-flame" height="16" width="16"></svg>Popular repo</div>
+            <h1 class="h4 lh-condensed">
+              <a href="/{user_id}/{repository}"><svg class="octicon octicon-repo mr-1" height="16" width="16"></svg>
+                {repository}
+              </a>
+            </h1>
+{description}            </article>
+          </div>
+        </div>
+"""
+
+DEVELOPER_REPOSITORY_DESCRIPTION = """            <div class="f6 color-text-secondary mt-1">
+              {}
+            </div>
+"""
+
+
+def get_chrome(content_type):
+    """
+    Get the markup around the trending articles of a saved page, so generated pages keep the size and structure
+    of the header, navigation and footer of real ones
+    :param content_type: ContentTypes value of the page
+    :return: tuple of the markup before the first article and after the last one
+    """
+    with open(os.path.join(CORPUS_DIR, TEMPLATES[content_type]), "r", encoding="utf-8") as f:
+        page = f.read()
+    start = page.index("              <article")
+    end = page.rindex("</article>") + len("</article>\n")
+    return page[:start], page[end:]
+
+
+def get_text(rng, words):
+    return escape(" ".join(rng.choice(WORDS) for _ in range(words)))
+
+
+def generate_repository(rng, index):
+    owner = "org{}".format(index)
+    name = "project-{}".format(index)
+    if index % 7 == 3:
+        description = ""
+    elif index % 5 == 0:
+        description = REPOSITORY_DESCRIPTION.format(get_text(rng, 80))
+    else:
+        description = REPOSITORY_DESCRIPTION.format(get_text(rng, 12))
+    language = "" if index % 6 == 4 else REPOSITORY_LANGUAGE.format(escape(rng.choice(LANGUAGES)))
+    stars_gained = "" if index % 9 == 8 else REPOSITORY_STARS_GAINED.format("{:,}".format(rng.randint(0, 5000)))
+    return REPOSITORY_ARTICLE.format(
+        owner=owner,
+        name=name,
+        description=description,
+        language=language,
+        stars="{:,}".format(rng.randint(0, 250000)),
+        forks="{:,}".format(rng.randint(0, 30000)),
+        stars_gained=stars_gained
+    )
+
+
+def generate_developer(rng, index):
+    user_id = "dev{}".format(index)
+    repository = ""
+    if index % 3:
+        description = "" if index % 4 == 1 else DEVELOPER_REPOSITORY_DESCRIPTION.format(
+            get_text(rng, 60 if index % 5 == 0 else 10))
+        repository = DEVELOPER_REPOSITORY.format(user_id=user_id, repository="repo-{}".format(index),
+                                                 description=description)
+    return DEVELOPER_ARTICLE.format(
+        user_id=user_id,
+        rank=index + 1,
+        name="{} {}".format(get_text(rng, 2), index) if index % 2 else "Developer Number {}".format(index),
+        repository=repository
+    )
+
+
+def generate_page(content_type, items, seed=0):
+    """
+    Generate a valid trending page with any number of articles, using the class names the extractors look for.
+    Articles mix long Unicode descriptions with missing descriptions, languages, star counts and popular repositories.
+    :param content_type: ContentTypes value of the page
+    :param items: number of articles
+    :param seed: seed for the generated values
+    :return: page as UTF-8 bytes
+    """
+    rng = random.Random(seed)
+    generate = generate_repository if content_type == ContentTypes.REPOSITORIES else generate_developer
+    head, tail = get_chrome(content_type)
+    return "".join([head] + [generate(rng, index) for index in range(items)] + [tail]).encode("utf-8")
+
+
+class SyntheticPage:
+    mode = ArchiveModes.REPLAY
+
+    def __init__(self, content_type, items, seed=0):
+        """
+        Stand-in for PageArchive that replays a generated page for every URL
+        :param content_type: ContentTypes value of the page
+        :param items: number of articles
+        :param seed: seed for the generated values
+        """
+        self.content_type = content_type
+        self.items = items
+        self.content = generate_page(content_type, items, seed)
+
+    def load(self, url):
+        return self.content, "utf-8", 200
+
+
+def main():
+    parser = ArgumentParser(description='Write a synthetic trending page with any number of articles')
+    parser.add_argument('items', type=int, help='number of articles')
+    parser.add_argument('--devs', action='store_true', help='generate a developers page instead of repositories')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated values')
+    args = parser.parse_args()
+
+    content_type = ContentTypes.DEVELOPERS if args.devs else ContentTypes.REPOSITORIES
+    sys.stdout.buffer.write(generate_page(content_type, args.items, args.seed))
+
+
+if __name__ == "__main__":
+    main()
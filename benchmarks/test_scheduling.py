@@ -0,0 +1,203 @@
+import io
+import time
+
+import pytest
+
+import standin
+from cache import ResultCache
+from fetcher import Fetcher
+from pipeline import Pipeline
+from planner import SweepPlanner
+from polling import PollSchedule
+from trending import Repositories
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def make_job(language):
+    return None, Repositories, {"period": "daily", "language": language, "spoken_language": None}
+
+
+def get_url(job):
+    _, trends_class, query = job
+    return trends_class.build_url(**query)
+
+
+def cache_result(cache, job, age, empty=False):
+    """
+    Store a cached result for a query as if it had been fetched some time ago
+    """
+    url = get_url(job)
+    cache.write_entry(url, {"url": url, "fetched_at": time.time() - age, "digest": None, "trending": {},
+                            "empty": empty})
+
+
+def make_planner(tmp_path, budget=600):
+    cache = ResultCache(directory=str(tmp_path), ttl=600)
+    return SweepPlanner(cache, budget=budget)
+
+
+def get_planned_languages(planner, jobs):
+    return [job[2]["language"] for _, job in planner.plan(jobs)]
+
+
+def test_planner_ranks_stale_lists_first(tmp_path):
+    planner = make_planner(tmp_path)
+    jobs = [make_job("python"), make_job("rust"), make_job("go")]
+    cache_result(planner.cache, jobs[0], 2 * HOUR)
+    cache_result(planner.cache, jobs[1], 20 * HOUR)
+    cache_result(planner.cache, jobs[2], 8 * HOUR)
+
+    assert get_planned_languages(planner, jobs) == ["rust", "go", "python"]
+
+
+def test_planner_ranks_fast_changing_lists_first(tmp_path):
+    planner = make_planner(tmp_path)
+    jobs = [make_job("python"), make_job("rust")]
+    for job in jobs:
+        cache_result(planner.cache, job, 4 * HOUR)
+    for index in range(10):
+        planner.record_check(get_url(jobs[0]), changed=index < 1)
+        planner.record_check(get_url(jobs[1]), changed=index < 9)
+
+    assert get_planned_languages(planner, jobs) == ["rust", "python"]
+
+
+def test_planner_ranks_requested_lists_first(tmp_path):
+    planner = make_planner(tmp_path)
+    jobs = [make_job("python"), make_job("rust")]
+    for job in jobs:
+        cache_result(planner.cache, job, 4 * HOUR)
+    for _ in range(5):
+        planner.record_request(get_url(jobs[1]))
+
+    assert get_planned_languages(planner, jobs) == ["rust", "python"]
+
+
+def test_planner_skips_fresh_and_recently_empty_lists(tmp_path):
+    planner = make_planner(tmp_path)
+    jobs = [make_job("python"), make_job("rust"), make_job("go"), make_job("java")]
+    cache_result(planner.cache, jobs[0], 60)
+    cache_result(planner.cache, jobs[1], HOUR, empty=True)
+    cache_result(planner.cache, jobs[2], 2 * HOUR)
+
+    # go has expired, java was never fetched; python is fresh and rust within the empty ttl
+    assert get_planned_languages(planner, jobs) == ["java", "go"]
+
+
+def test_planner_keeps_within_budget(tmp_path):
+    planner = make_planner(tmp_path, budget=10)
+    jobs = [make_job(language) for language in ("python", "rust", "go", "java", "c")]
+    planner.spend(8)
+
+    assert len(planner.plan(jobs)) == 2
+    planner.spend(2)
+    assert planner.plan(jobs) == []
+    # Requests older than an hour no longer count against the budget
+    assert len(planner.plan(jobs, now=time.time() + HOUR + 1)) == 5
+
+
+def poll(schedule, url, polls, now):
+    """
+    Record a series of polls of a page an hour apart
+    :param polls: list of (keys, cached) tuples
+    :return: interval of the page after every poll
+    """
+    intervals = []
+    for index, (keys, cached) in enumerate(polls):
+        schedule.record(url, keys, cached=cached, now=now + index * HOUR)
+        intervals.append(schedule.pages[url]["interval"])
+    return intervals
+
+
+def test_polling_interval_adapts_to_changes():
+    schedule = PollSchedule(min_interval=100, max_interval=1000)
+    unchanged = [(["a", "b"], False)] * 6
+    changed = [(["b", "a"], False), (["a", "b"], False), (["b", "a"], False)]
+
+    # The first poll only records the list; unchanged polls back off by half up to the maximum, changes halve it
+    assert poll(schedule, "url", unchanged + changed, now=10 * DAY + 30 * 60) == \
+        [100, 150, 225, 337.5, 506.25, 759.375, 379.6875, 189.84375, 100]
+
+
+def test_polling_ignores_cached_results():
+    schedule = PollSchedule(min_interval=100, max_interval=1000)
+    polls = [(["a"], False), (["a"], True), (["b"], True), (["b"], False)]
+
+    assert poll(schedule, "url", polls, now=10 * DAY) == [100, 100, 100, 150]
+
+
+def test_polling_learns_regeneration_hour():
+    schedule = PollSchedule(min_interval=100, max_interval=12 * HOUR)
+    # The list changes shortly after 03:00 UTC every day; the first poll only records it
+    for day in range(10, 15):
+        schedule.record("url", ["a", str(day)], now=day * DAY + 3 * HOUR + 600)
+    page = schedule.pages["url"]
+
+    assert schedule.get_regeneration_hour(page) == 3
+    # Polled at 20:00 with a long interval, the next poll comes just after 03:00 instead of after the interval
+    page["interval"] = 12 * HOUR
+    now = 15 * DAY + 20 * HOUR
+    assert schedule.get_next_poll(page, now) == 16 * DAY + 3 * HOUR + 120
+    assert schedule.get_next_poll(page, now) < now + page["interval"]
+
+
+def test_polling_backs_off_failed_polls():
+    schedule = PollSchedule(min_interval=100, max_interval=1000)
+    now = 10 * DAY
+    schedule.record("url", ["a"], now=now)
+
+    # Every failure in a row doubles the wait up to the longest interval, without changing the learned interval
+    assert [schedule.record_failure("url", now=now) for _ in range(5)] == [200, 400, 800, 1000, 1000]
+    assert schedule.pages["url"]["interval"] == 100
+    assert schedule.pages["url"]["next_poll"] == now + 1000
+    # A poll that succeeds again resets the backoff
+    schedule.record("url", ["a"], now=now + HOUR)
+    assert schedule.record_failure("url", now=now + HOUR) == 2 * 150
+
+
+def test_polling_records_empty_polls():
+    schedule = PollSchedule(min_interval=100, max_interval=1000)
+    polls = [([], False), ([], False), (["a"], False), ([], False)]
+
+    # An empty list is a result like any other: unchanged, it backs off; appearing or emptying again, it is a change
+    assert poll(schedule, "url", polls, now=10 * DAY) == [100, 150, 100, 100]
+
+
+@pytest.fixture
+def failing_server():
+    server = standin.start_server(error_rate=1.0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def empty_server():
+    server = standin.start_server(empty_rate=1.0)
+    yield server
+    server.shutdown()
+
+
+def run_pipeline(server):
+    """
+    Run repository queries for three languages through the pipeline against a stand-in server
+    :return: list of (language, whether the page was empty) tuples passed to the skipped function
+    """
+    skipped = []
+    jobs = [(language, Repositories, {"period": "daily", "language": language, "base_url": server.url})
+            for language in ("python", "rust", "go")]
+    page_pipeline = Pipeline(fetcher=Fetcher(), err=io.StringIO())
+    failed = page_pipeline.run(jobs, lambda tag, trends: None,
+                               lambda trends_class, query, trends: skipped.append((query["language"],
+                                                                                   trends is not None)))
+    assert failed == 3
+    return sorted(skipped)
+
+
+def test_pipeline_reports_failed_polls(failing_server):
+    assert run_pipeline(failing_server) == [("go", False), ("python", False), ("rust", False)]
+
+
+def test_pipeline_reports_empty_polls(empty_server):
+    assert run_pipeline(empty_server) == [("go", True), ("python", True), ("rust", True)]
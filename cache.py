@@ -0,0 +1,188 @@
+import atexit
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import utils
+from enums import CacheStates
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "git-trend")
+DEFAULT_EMPTY_TTL = 6 * 3600
+REVALIDATE_GRACE = 1.0
+REVALIDATE_THREAD_NAME = "git-trend-revalidate"
+
+
+class ResultCache:
+    def __init__(self, directory=None, ttl=600, stale_while_revalidate=False, max_stale=3600,
+                 empty_ttl=DEFAULT_EMPTY_TTL):
+        """
+        On-disk cache of parsed trending results, keyed by the trending page URL
+        :param directory: Directory to store cache entries in
+        :param ttl: Seconds for which a cached result is considered fresh
+        :param stale_while_revalidate: Serve expired results immediately and refresh them in the background
+        :param max_stale: Seconds past the ttl for which an expired result may still be served
+        :param empty_ttl: Seconds for which a page without trending entries, or a missing page, is not fetched again
+        """
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_stale = max_stale
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get_path(self, url):
+        """
+        Get the file used to store the cache entry for a URL
+        :param url: URL of the trending page
+        :return: path of the cache entry
+        """
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "{}.json".format(digest))
+
+    def lookup(self, url):
+        """
+        Look up the parsed result for a URL and classify it as fresh, stale, empty or missing
+        :param url: URL of the trending page
+        :return: tuple of the cached trending data (or None) and its CacheStates value
+        """
+        try:
+            with open(self.get_path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            return None, CacheStates.MISS
+
+        if entry.get("url") != url:
+            return None, CacheStates.MISS
+
+        age = time.time() - entry["fetched_at"]
+        if entry.get("empty"):
+            if age <= self.empty_ttl:
+                return OrderedDict(), CacheStates.EMPTY
+            return None, CacheStates.MISS
+        if age <= self.ttl:
+            return entry["trending"], CacheStates.FRESH
+        if self.stale_while_revalidate and age <= self.ttl + self.max_stale:
+            return entry["trending"], CacheStates.STALE
+        return None, CacheStates.MISS
+
+    def get_age(self, url):
+        """
+        Get the age of the cache entry for a URL, regardless of whether it may still be served
+        :param url: URL of the trending page
+        :return: tuple of the age in seconds and whether the entry is empty, or None without an entry
+        """
+        try:
+            with open(self.get_path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("url") != url:
+            return None
+        return time.time() - entry["fetched_at"], bool(entry.get("empty"))
+
+    def lookup_digest(self, url):
+        """
+        Get the hash of the page a cached result was parsed from, regardless of the age of the entry
+        :param url: URL of the trending page
+        :return: tuple of the page digest and the trending data, or None
+        """
+        try:
+            with open(self.get_path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("url") != url or not entry.get("digest"):
+            return None
+        return entry["digest"], entry["trending"]
+
+    def put(self, url, trending, digest=None):
+        """
+        Store the parsed result for a URL, replacing any previous entry atomically
+        :param url: URL of the trending page
+        :param trending: parsed trending data
+        :param digest: hash of the page the result was parsed from
+        :return:
+        """
+        self.write_entry(url, {"url": url, "fetched_at": time.time(), "digest": digest, "trending": trending})
+
+    def put_empty(self, url, status_code=None):
+        """
+        Store a negative entry for a URL whose page has no trending entries or does not exist
+        :param url: URL of the trending page
+        :param status_code: HTTP status code of the page, e.g. 404, or None
+        :return:
+        """
+        self.write_entry(url, {"url": url, "fetched_at": time.time(), "digest": None, "trending": {}, "empty": True,
+                               "status_code": status_code})
+
+    def write_entry(self, url, entry):
+        """
+        Write a cache entry, replacing any previous entry atomically
+        :param url: URL of the trending page
+        :param entry: entry to store
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(url)
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def revalidate(self, url, refresh):
+        """
+        Run refresh in a background thread unless a refresh for the same URL is already running.
+        The thread is a daemon so it never keeps the process or its output pipe open for long; a process exiting
+        while a refresh runs waits at most REVALIDATE_GRACE seconds for it.
+        :param url: URL of the trending page
+        :param refresh: callable that fetches, parses and stores a fresh result
+        :return:
+        """
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def run():
+            try:
+                refresh()
+            except SystemExit:
+                # The page could not be fetched or parsed, which was already reported
+                pass
+            except Exception as e:
+                print("ERROR: Could not refresh the cached result for the URL: {}".format(url), file=sys.stderr)
+                print(utils.get_traceback_string(e), file=sys.stderr)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+        threading.Thread(target=run, name=REVALIDATE_THREAD_NAME, daemon=True).start()
+
+
+def wait_for_refreshes(timeout=REVALIDATE_GRACE):
+    """
+    Give the background refreshes still running a short time to finish, after flushing what was printed so readers
+    of the output are not held up by the wait
+    :param timeout: seconds to wait for all of them together
+    :return:
+    """
+    threads = [thread for thread in threading.enumerate() if thread.name == REVALIDATE_THREAD_NAME]
+    if not threads:
+        return
+    try:
+        sys.stdout.flush()
+    except (OSError, ValueError):
+        pass
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+
+atexit.register(wait_for_refreshes)
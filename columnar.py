@@ -0,0 +1,112 @@
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import utils
+from enums import ContentTypes
+
+PARTITION_COLUMNS = ["date", "period", "query_language"]
+
+
+def check_pyarrow(out=None):
+    """
+    Import the optional pyarrow dependency, exiting with an error when it is not installed.
+    It is imported on first use rather than with this module, as importing it takes longer than the rest of git-trend
+    and most runs never write Arrow or Parquet output.
+    :param out: text stream for the error, defaults to the current sys.stdout
+    :return: the pyarrow module, with pyarrow.dataset loaded
+    """
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError:
+        print("ERROR: pyarrow is required for Arrow and Parquet output. Install it using: pip install git-trend[parquet]",
+              file=out or sys.stdout)
+        exit(1)
+    return pyarrow
+
+
+def get_schema(content_type):
+    """
+    Get the Arrow schema for trending records of a content type
+    :param content_type: Type of content the records were parsed from
+    :return: pyarrow Schema
+    """
+    pa = check_pyarrow()
+    common = [
+        pa.field("fetched_at", pa.timestamp("s", tz="UTC")),
+        pa.field("date", pa.string()),
+        pa.field("period", pa.dictionary(pa.int8(), pa.string())),
+        pa.field("query_language", pa.dictionary(pa.int16(), pa.string())),
+        pa.field("rank", pa.int16()),
+    ]
+    if content_type == ContentTypes.REPOSITORIES:
+        return pa.schema(common + [
+            pa.field("repository", pa.string()),
+            pa.field("description", pa.string()),
+            pa.field("language", pa.dictionary(pa.int16(), pa.string())),
+            pa.field("stars", pa.int64()),
+            pa.field("stars_gained", pa.int64()),
+            pa.field("url", pa.string()),
+        ])
+    return pa.schema(common + [
+        pa.field("name", pa.string()),
+        pa.field("user_id", pa.string()),
+        pa.field("repository", pa.string()),
+        pa.field("description", pa.string()),
+        pa.field("url", pa.string()),
+    ])
+
+
+def to_record_batch(trends, fetched_at=None):
+    """
+    Convert parsed trends to an Arrow RecordBatch with typed columns
+    :param trends: parsed Trends object
+    :param fetched_at: time the page was fetched, defaults to now
+    :return: pyarrow RecordBatch
+    """
+    pa = check_pyarrow()
+    fetched_at = fetched_at or datetime.now(timezone.utc).replace(microsecond=0)
+    schema = get_schema(trends.content_type)
+    records = [trends.get_record(key, value) for key, value in trends.trending.items()]
+
+    columns = {
+        "fetched_at": [fetched_at] * len(records),
+        "date": [fetched_at.strftime("%Y-%m-%d")] * len(records),
+        "period": [trends.period] * len(records),
+        "query_language": [trends.language or "all"] * len(records),
+    }
+    for field in trends.get_fieldnames():
+        columns[field] = [record[field] for record in records]
+    if trends.content_type == ContentTypes.REPOSITORIES:
+        columns["stars"] = [utils.parse_count(stars) for stars in columns["stars"]]
+        columns["stars_gained"] = [utils.parse_count(stars) for stars in columns["stars_gained"]]
+        columns["language"] = [language or None for language in columns["language"]]
+
+    arrays = [pa.array(columns[field.name], type=field.type) for field in schema]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(path, batches):
+    """
+    Append record batches to a Parquet dataset partitioned by date, period and language.
+    Each call writes new files, so repeated runs add to the dataset instead of replacing it.
+    :param path: Directory of the dataset
+    :param batches: RecordBatches sharing the same schema
+    :return:
+    """
+    pa = check_pyarrow()
+    if not batches:
+        return
+    table = pa.Table.from_batches(batches)
+    os.makedirs(path, exist_ok=True)
+    pa.dataset.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=PARTITION_COLUMNS,
+        partitioning_flavor="hive",
+        basename_template="part-{}-{{i}}.parquet".format(uuid.uuid4().hex),
+        existing_data_behavior="overwrite_or_ignore"
+    )
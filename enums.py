@@ -12,6 +12,10 @@ class Formats(str, Enum):
     DEFAULT = "default"
     TABLE = "table"
     JSON = "json"
+    JSON_COMPACT = "json-compact"
+    NDJSON = "ndjson"
+    CSV = "csv"
+    PARQUET = "parquet"
 
 
 class Periods(str, Enum):
@@ -23,3 +27,15 @@ class Periods(str, Enum):
 class ContentTypes(str, Enum):
     REPOSITORIES = "repositories"
     DEVELOPERS = "developers"
+
+
+class CacheStates(str, Enum):
+    FRESH = "fresh"
+    STALE = "stale"
+    EMPTY = "empty"
+    MISS = "miss"
+
+
+class ArchiveModes(str, Enum):
+    RECORD = "record"
+    REPLAY = "replay"
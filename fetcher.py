@@ -0,0 +1,142 @@
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+import requests
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_HEDGE_DELAY = 1.0
+LATENCY_SAMPLES = 200
+MIN_SAMPLES_FOR_P95 = 5
+
+
+class Fetcher:
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, deadline=None,
+                 hedge=False, hedge_delay=None, session=None):
+        """
+        Download pages with bounded waits.
+        Every request has a connect and a read timeout, and all requests made through the same fetcher can share an
+        overall deadline. With hedging, a duplicate request is sent when the first has not answered after the 95th
+        percentile of the latencies seen so far, and whichever response arrives first is used.
+        :param connect_timeout: seconds to wait for a connection to be established
+        :param read_timeout: seconds to wait between bytes received from the server
+        :param deadline: seconds from now after which no request may still be waiting, or None
+        :param hedge: whether to send a duplicate request for slow responses
+        :param hedge_delay: fixed delay before the duplicate request, instead of the observed 95th percentile
+        :param session: optional requests Session, to reuse connections across requests
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = time.monotonic() + deadline if deadline is not None else None
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.session = session
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def get_remaining(self):
+        """
+        Get the time left before the deadline
+        :return: seconds left, or None without a deadline
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def get_timeout(self):
+        """
+        Get the (connect, read) timeouts for the next request, shortened so that no wait goes past the deadline
+        :return: tuple of connect and read timeouts
+        """
+        remaining = self.get_remaining()
+        if remaining is None:
+            return self.connect_timeout, self.read_timeout
+        if remaining <= 0:
+            raise requests.exceptions.Timeout("Deadline exceeded before the request was sent")
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def get_hedge_delay(self):
+        """
+        Get the time to wait for a response before sending a duplicate request
+        :return: delay in seconds
+        """
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_SAMPLES_FOR_P95:
+            return DEFAULT_HEDGE_DELAY
+        return samples[math.ceil(0.95 * len(samples)) - 1]
+
+    def request(self, url, headers):
+        timeout = self.get_timeout()
+        with self._lock:
+            self.requests += 1
+        start = time.monotonic()
+        get = self.session.get if self.session is not None else requests.get
+        response = get(url, headers=headers, timeout=timeout)
+        with self._lock:
+            self.latencies.append(time.monotonic() - start)
+        return response
+
+    def start(self, url, headers, results, name):
+        """
+        Send a request from a daemon thread, so a losing hedged request never keeps the process alive
+        :param url: URL to fetch
+        :param headers: request headers
+        :param results: queue receiving a (name, response, exception) tuple once the request ends
+        :param name: name of the copy, "primary" or "hedge"
+        :return:
+        """
+        def run():
+            try:
+                results.put((name, self.request(url, headers), None))
+            except Exception as e:
+                results.put((name, None, e))
+
+        threading.Thread(target=run, name="git-trend-{}".format(name), daemon=True).start()
+
+    def get(self, url, headers=None, span=None):
+        """
+        Download a page
+        :param url: URL to fetch
+        :param headers: request headers
+        :param span: optional profile span attributes, updated with whether the request was hedged
+        :return: requests Response
+        """
+        if not self.hedge:
+            return self.request(url, headers)
+
+        delay = self.get_hedge_delay()
+        remaining = self.get_remaining()
+        if remaining is not None and remaining <= delay:
+            return self.request(url, headers)
+
+        results = queue.Queue()
+        self.start(url, headers, results, "primary")
+        try:
+            _, response, error = results.get(timeout=delay)
+        except queue.Empty:
+            pass
+        else:
+            if error is not None:
+                raise error
+            return response
+
+        self.start(url, headers, results, "hedge")
+        if span is not None:
+            span["hedged"] = True
+            span["hedge_delay"] = round(delay, 4)
+        error = None
+        for _ in range(2):
+            name, response, failure = results.get()
+            if failure is None:
+                if span is not None:
+                    span["winner"] = name
+                return response
+            error = failure
+        raise error
@@ -0,0 +1,219 @@
+from array import array
+
+import utils
+from enums import ContentTypes
+
+ACCOUNT = "account"
+REPOSITORY = "repository"
+LANGUAGE = "language"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS graph_nodes (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_developer INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (kind, name)
+);
+
+CREATE TABLE IF NOT EXISTS graph_edges (
+    source INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (source, target)
+) WITHOUT ROWID;
+"""
+
+
+class TrendGraph:
+    def __init__(self, connection):
+        """
+        Graph of accounts (developers and organisations), repositories and languages seen on trending lists.
+        Nodes are interned to integer ids; edges are persisted in SQLite on every run and held in memory as
+        per-node arrays of neighbour ids and last-seen times once loaded for querying.
+        :param connection: sqlite3 connection of the snapshot store
+        """
+        self.connection = connection
+        self.connection.executescript(SCHEMA)
+        self.ids = {}
+        self.loaded = False
+        self.data_version = None
+        self.kinds = []
+        self.names = []
+        self.developers = bytearray()
+        self.neighbors = []
+        self.last_seen = []
+        self.edge_index = {}
+
+    def get_node_id(self, kind, name):
+        """
+        Get the integer id of a node, creating the node if needed
+        :param kind: ACCOUNT, REPOSITORY or LANGUAGE
+        :param name: name of the node
+        :return: node id
+        """
+        node_id = self.ids.get((kind, name))
+        if node_id is not None:
+            return node_id
+        self.connection.execute("INSERT OR IGNORE INTO graph_nodes (kind, name) VALUES (?, ?)", (kind, name))
+        node_id = self.connection.execute(
+            "SELECT id FROM graph_nodes WHERE kind = ? AND name = ?", (kind, name)).fetchone()[0]
+        self.ids[(kind, name)] = node_id
+        if self.loaded:
+            self.add_node_in_memory(node_id, kind, name, False)
+        return node_id
+
+    def mark_developer(self, node_id):
+        self.connection.execute("UPDATE graph_nodes SET is_developer = 1 WHERE id = ?", (node_id,))
+        if self.loaded:
+            self.developers[node_id] = 1
+
+    def add_edge(self, source, target, taken_at):
+        """
+        Link two nodes, or refresh the time at which an existing link was last seen
+        :param source: node id
+        :param target: node id
+        :param taken_at: time of the snapshot the link was seen in
+        :return:
+        """
+        source, target = min(source, target), max(source, target)
+        self.connection.execute(
+            "INSERT OR IGNORE INTO graph_edges (source, target, last_seen) VALUES (?, ?, ?)",
+            (source, target, taken_at))
+        self.connection.execute(
+            "UPDATE graph_edges SET last_seen = MAX(last_seen, ?) WHERE source = ? AND target = ?",
+            (taken_at, source, target))
+        if self.loaded:
+            self.add_edge_in_memory(source, target, taken_at)
+
+    def add(self, trends, taken_at):
+        """
+        Add the links found in a parsed trending list.
+        Repositories link their owner and their language; developers link their featured repository and,
+        for language specific lists, the language they trended in.
+        :param trends: parsed Trends object
+        :param taken_at: time of the snapshot
+        :return:
+        """
+        list_language = self.get_node_id(LANGUAGE, trends.language) if trends.language else None
+
+        for key, value in trends.trending.items():
+            if trends.content_type == ContentTypes.REPOSITORIES:
+                repository = self.get_node_id(REPOSITORY, key)
+                owner = self.get_node_id(ACCOUNT, key.split("/")[0])
+                self.add_edge(owner, repository, taken_at)
+                language_code = utils.get_language_code(value.get("language", ""))
+                if language_code:
+                    self.add_edge(repository, self.get_node_id(LANGUAGE, language_code), taken_at)
+                elif list_language is not None:
+                    self.add_edge(repository, list_language, taken_at)
+            else:
+                account = self.get_node_id(ACCOUNT, value["user_id"])
+                self.mark_developer(account)
+                if value.get("repository"):
+                    repository = self.get_node_id(REPOSITORY, "{}/{}".format(value["user_id"], value["repository"]))
+                    self.add_edge(account, repository, taken_at)
+                if list_language is not None:
+                    self.add_edge(account, list_language, taken_at)
+
+    def get_data_version(self):
+        """
+        Get the SQLite data version of the connection, which changes whenever another connection commits to the store
+        :return: data version
+        """
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_current(self):
+        """
+        Check whether the in-memory adjacency lists match the store. Additions made through this graph keep them
+        current; additions made by other processes, such as a run with --store, make them outdated.
+        :return: True if the graph is loaded and no other connection wrote to the store since
+        """
+        return self.loaded and self.get_data_version() == self.data_version
+
+    def load(self):
+        """
+        Build the in-memory adjacency lists from the store. Later additions keep them up to date.
+        :return:
+        """
+        self.kinds, self.names, self.developers = [], [], bytearray()
+        self.neighbors, self.last_seen, self.edge_index = [], [], {}
+        self.loaded = True
+        self.data_version = self.get_data_version()
+        for node_id, kind, name, is_developer in self.connection.execute(
+                "SELECT id, kind, name, is_developer FROM graph_nodes ORDER BY id"):
+            self.add_node_in_memory(node_id, kind, name, is_developer)
+            self.ids[(kind, name)] = node_id
+        for source, target, last_seen in self.connection.execute("SELECT source, target, last_seen FROM graph_edges"):
+            self.add_edge_in_memory(source, target, last_seen)
+
+    def add_node_in_memory(self, node_id, kind, name, is_developer):
+        while len(self.names) <= node_id:
+            self.kinds.append(None)
+            self.names.append(None)
+            self.developers.append(0)
+            self.neighbors.append(array("l"))
+            self.last_seen.append(array("d"))
+        self.kinds[node_id] = kind
+        self.names[node_id] = name
+        self.developers[node_id] = 1 if is_developer else 0
+
+    def add_edge_in_memory(self, source, target, last_seen):
+        for a, b in ((source, target), (target, source)):
+            position = self.edge_index.get((a, b))
+            if position is None:
+                self.edge_index[(a, b)] = len(self.neighbors[a])
+                self.neighbors[a].append(b)
+                self.last_seen[a].append(last_seen)
+            elif last_seen > self.last_seen[a][position]:
+                self.last_seen[a][position] = last_seen
+
+    def iter_neighbors(self, node_id, kind, since=0):
+        """
+        Iterate over the neighbours of a node of a given kind, linked at or after a time
+        :param node_id: node id
+        :param kind: kind of neighbour to return
+        :param since: timestamp
+        :return: generator of node ids
+        """
+        for neighbor, last_seen in zip(self.neighbors[node_id], self.last_seen[node_id]):
+            if last_seen >= since and self.kinds[neighbor] == kind:
+                yield neighbor
+
+    def get_developers_in_language(self, language, since=0):
+        """
+        Get the developers whose repositories trended in a language
+        :param language: language code, e.g. "rust"
+        :param since: only consider links seen at or after this timestamp
+        :return: sorted list of developer account names
+        """
+        if not self.is_current():
+            self.load()
+        language_id = self.ids.get((LANGUAGE, utils.get_language_code(language) or language))
+        if language_id is None:
+            return []
+        developers = set()
+        for repository in self.iter_neighbors(language_id, REPOSITORY, since):
+            for account in self.iter_neighbors(repository, ACCOUNT, since):
+                if self.developers[account]:
+                    developers.add(self.names[account])
+        return sorted(developers)
+
+    def get_co_trending(self, repository, since=0):
+        """
+        Get other repositories of the same owner that trended
+        :param repository: repository as org/repo
+        :param since: only consider links seen at or after this timestamp
+        :return: sorted list of repositories
+        """
+        if not self.is_current():
+            self.load()
+        repository_id = self.ids.get((REPOSITORY, repository))
+        if repository_id is None:
+            return []
+        related = set()
+        for owner in self.iter_neighbors(repository_id, ACCOUNT):
+            for other in self.iter_neighbors(owner, REPOSITORY, since):
+                if other != repository_id:
+                    related.add(self.names[other])
+        return sorted(related)
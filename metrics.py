@@ -0,0 +1,251 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ITEM_BUCKETS = (0, 1, 5, 10, 15, 20, 25, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LABELS = ("content_type", "language", "period")
+
+
+def format_labels(labelnames, values):
+    """
+    Format label names and values in the Prometheus text exposition format
+    :param labelnames: Names of the labels
+    :param values: Values of the labels, in the same order
+    :return: formatted label set, empty when there are no labels
+    """
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append('{}="{}"'.format(name, value))
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Monotonically increasing value per label set
+        :param name: Metric name
+        :param documentation: Help text for the metric
+        :param labelnames: Names of the labels the metric is partitioned by
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} counter".format(self.name)]
+        with self._lock:
+            for key, value in sorted(self.values.items()):
+                lines.append("{}{} {}".format(self.name, format_labels(self.labelnames, key), value))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Distribution of observed values per label set, in cumulative buckets
+        :param name: Metric name
+        :param documentation: Help text for the metric
+        :param labelnames: Names of the labels the metric is partitioned by
+        :param buckets: Upper bounds of the buckets, in increasing order
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            bucket_counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+            self.values[key] = (bucket_counts, total + value, count + 1)
+
+    def collect(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} histogram".format(self.name)]
+        bucket_labels = self.labelnames + ("le",)
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append("{}_bucket{} {}".format(
+                        self.name, format_labels(bucket_labels, key + (bound,)), bucket_count))
+                lines.append("{}_bucket{} {}".format(self.name, format_labels(bucket_labels, key + ("+Inf",)), count))
+                lines.append("{}_sum{} {}".format(self.name, format_labels(self.labelnames, key), total))
+                lines.append("{}_count{} {}".format(self.name, format_labels(self.labelnames, key), count))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        """
+        Collection of metrics rendered together in the Prometheus text exposition format
+        """
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render every metric in the registry
+        :return: exposition text
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "git_trend_fetch_seconds", "Time spent downloading trending pages", LABELS)
+PARSE_SECONDS = REGISTRY.histogram(
+    "git_trend_parse_seconds", "Time spent parsing trending pages, from soup construction to extraction", LABELS)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "git_trend_cache_lookups_total", "Cache lookups by result (fresh, stale, empty or miss)", LABELS + ("result",))
+HTTP_RESPONSES = REGISTRY.counter(
+    "git_trend_http_responses_total", "Responses received from GitHub by status code", LABELS + ("code",))
+FETCH_ERRORS = REGISTRY.counter(
+    "git_trend_fetch_errors_total", "Downloads that got no response from GitHub, by exception type",
+    LABELS + ("error",))
+FETCHED_BYTES = REGISTRY.counter(
+    "git_trend_fetched_bytes_total", "Bytes of trending pages downloaded", LABELS)
+ITEMS_EXTRACTED = REGISTRY.histogram(
+    "git_trend_items_extracted", "Trending items extracted per page", LABELS, buckets=ITEM_BUCKETS)
+
+PARSE_STAGES = ("soup", "parse_content", "find_all", "parse")
+
+
+def get_labels(content_type, language, period):
+    """
+    Get the labels the metrics of a query are partitioned by
+    :param content_type: ContentTypes of the query
+    :param language: Language of the query, or None for all languages
+    :param period: Period of the query
+    :return: dict of label values
+    """
+    return {"content_type": content_type.value, "language": language or "all", "period": period}
+
+
+def record_response(status_code, size, seconds, labels):
+    """
+    Count a response received from GitHub, whatever its status, as soon as it is downloaded
+    :param status_code: HTTP status code of the response
+    :param size: Size of the response body in bytes
+    :param seconds: Time spent downloading the response
+    :param labels: Labels of the query, from get_labels
+    :return:
+    """
+    FETCH_SECONDS.observe(seconds, **labels)
+    FETCHED_BYTES.inc(size, **labels)
+    HTTP_RESPONSES.inc(code=status_code, **labels)
+
+
+def record_fetch_error(error, labels):
+    """
+    Count a download that failed before GitHub answered, e.g. on a timeout or a refused connection
+    :param error: Exception raised by the download
+    :param labels: Labels of the query, from get_labels
+    :return:
+    """
+    FETCH_ERRORS.inc(error=type(error).__name__, **labels)
+
+
+def record_cache_lookup(state, labels):
+    """
+    Count a cache lookup made to decide whether a query is served from the cache
+    :param state: CacheStates of the lookup
+    :param labels: Labels of the query, from get_labels
+    :return:
+    """
+    CACHE_LOOKUPS.inc(result=state.value, **labels)
+
+
+def record(trends):
+    """
+    Update the parse metrics from a Trends object once it has been parsed, using its profile.
+    Downloads and cache lookups are counted when they happen, so failed and empty queries are counted too.
+    :param trends: parsed Trends object
+    :return:
+    """
+    labels = get_labels(trends.content_type, trends.language, trends.period)
+
+    parse_seconds = 0.0
+    parsed = False
+    for span in trends.profile.spans:
+        if span["stage"] in PARSE_STAGES:
+            parse_seconds += span["seconds"]
+            parsed = True
+
+    if parsed:
+        PARSE_SECONDS.observe(parse_seconds, **labels)
+    ITEMS_EXTRACTED.observe(len(trends.trending), **labels)
+
+
+def write_textfile(path, registry=REGISTRY):
+    """
+    Write the metrics for the node_exporter textfile collector, replacing the file atomically
+    :param path: Path of the .prom file to write
+    :param registry: Registry to render
+    :return:
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_http_server(port, address="", registry=REGISTRY):
+    """
+    Serve the metrics on /metrics from a background thread
+    :param port: Port to listen on
+    :param address: Address to bind to
+    :param registry: Registry to render
+    :return: the running server, which can be stopped with shutdown()
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class MetricsServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = MetricsServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="git-trend-metrics", daemon=True).start()
+    return server
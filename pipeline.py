@@ -0,0 +1,348 @@
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+import metrics
+import render
+import utils
+from enums import ArchiveModes, CacheStates
+from profiling import Profile
+
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_PARSE_WORKERS = 1
+DEFAULT_QUEUE_SIZE = 8
+
+
+class StageStats:
+    def __init__(self, name, workers):
+        """
+        Time spent by the workers of a pipeline stage working, waiting for input and blocked on a full output queue
+        :param name: Name of the stage
+        :param workers: Number of workers of the stage
+        """
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+        self.max_queue = 0
+        self._lock = threading.Lock()
+
+    def add(self, items=0, busy=0.0, idle=0.0, blocked=0.0, queue_size=0):
+        with self._lock:
+            self.items += items
+            self.busy += busy
+            self.idle += idle
+            self.blocked += blocked
+            self.max_queue = max(self.max_queue, queue_size)
+
+    def get_utilization(self, elapsed):
+        """
+        Get the share of the time the workers of the stage spent working
+        :param elapsed: Wall clock seconds of the run
+        :return: utilization between 0 and 1
+        """
+        if not elapsed:
+            return 0.0
+        return min(1.0, self.busy / (elapsed * self.workers))
+
+
+def parse_page(trends_class, query, page):
+    """
+    Parse a downloaded page in a worker process
+    :param trends_class: Trends subclass of the query
+    :param query: arguments of the query
+    :param page: tuple of the page body, its encoding and the status code
+    :return: parsed Trends object, without its page
+    """
+    trends = trends_class(page=page, **query)
+    trends.parse()
+    return trends
+
+
+def get_metric_labels(trends_class, query):
+    """
+    Get the labels the metrics of a query are counted under
+    :param trends_class: Trends subclass of the query
+    :param query: arguments of the query
+    :return: dict of label values
+    """
+    return metrics.get_labels(trends_class.content_type, query.get("language"), query["period"])
+
+
+class Pipeline:
+    def __init__(self, cache=None, archive=None, fetcher=None, fetch_workers=DEFAULT_FETCH_WORKERS,
+                 parse_workers=DEFAULT_PARSE_WORKERS, processes=False, queue_size=DEFAULT_QUEUE_SIZE, err=None):
+        """
+        Run queries through separate fetch, parse and write stages, so pages are downloaded while earlier ones are
+        still being parsed and written.
+        Stages are connected by bounded queues: when parsing or writing falls behind, the queues fill up and the
+        stages before them wait instead of holding every downloaded page in memory.
+        :param cache: Optional ResultCache to serve and store parsed results
+        :param archive: Optional PageArchive to record fetched pages to or replay them from
+        :param fetcher: Fetcher to download pages with, shared by the fetch workers
+        :param fetch_workers: Number of pages downloaded at the same time
+        :param parse_workers: Number of pages parsed at the same time
+        :param processes: Whether to parse in a pool of processes instead of threads, to use several CPU cores
+        :param queue_size: Number of pages each queue holds before the stage feeding it waits
+        :param err: Optional text stream for error messages, defaults to the current sys.stderr
+        """
+        self.cache = cache
+        self.archive = archive
+        self.fetcher = fetcher
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.processes = processes
+        self.queue_size = queue_size
+        self.err = err or sys.stderr
+        self.stages = []
+        self.failed = 0
+        self.skipped = None
+        self.elapsed = 0.0
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def fetch(self, trends_class, query):
+        """
+        Download the page of a query, unless it will be served from the archive or the cache
+        :param trends_class: Trends subclass of the query
+        :param query: arguments of the query
+        :return: tuple of the page (body, encoding, status code) or None, and the profile span of the download or None
+        """
+        if self.archive is not None and self.archive.mode == ArchiveModes.REPLAY:
+            return None, None
+        url = trends_class.build_url(**query)
+        if self.cache is not None and self.cache.lookup(url)[1] != CacheStates.MISS:
+            return None, None
+
+        labels = get_metric_labels(trends_class, query)
+        profile = Profile()
+        try:
+            with profile.span("fetch") as span:
+                page = trends_class.download(url, self.fetcher, archive=self.archive, span=span, labels=labels)
+        except requests.exceptions.RequestException:
+            # The query never reaches the parser, where its cache lookup is otherwise counted
+            if self.cache is not None:
+                metrics.record_cache_lookup(CacheStates.MISS, labels)
+            raise
+        return page, profile.spans[0]
+
+    def parse(self, trends_class, query, page, executor=None):
+        """
+        Parse the page of a query, in a worker process when an executor is given.
+        Pages served from the cache or the archive, and pages unchanged since they were last parsed, are handled
+        in this process as they need no parsing.
+        :param trends_class: Trends subclass of the query
+        :param query: arguments of the query
+        :param page: tuple of the page body, its encoding and the status code, or None
+        :param executor: Optional ProcessPoolExecutor
+        :return: parsed Trends object
+        """
+        if executor is not None and page is not None:
+            previous = trends_class.get_previous_page(trends_class.build_url(**query), self.cache)
+            if previous is None or previous[0] != trends_class.get_page_digest(page[0]):
+                # The worker parses without the cache, so the miss that led to the download is counted here
+                if self.cache is not None:
+                    metrics.record_cache_lookup(CacheStates.MISS, get_metric_labels(trends_class, query))
+                trends = executor.submit(parse_page, trends_class, query, page).result()
+                trends.cache = self.cache
+                trends.archive = self.archive
+                trends.fetcher = self.fetcher
+                trends.err = self.err
+                if trends.empty:
+                    trends.mark_empty()
+                else:
+                    trends.save_to_cache()
+                return trends
+
+        trends = trends_class(cache=self.cache, archive=self.archive, fetcher=self.fetcher, page=page, err=self.err,
+                              **query)
+        trends.parse()
+        return trends
+
+    def skip(self, tag, trends_class, query, trends=None):
+        """
+        Count a query that produced no result and pass it to the skipped function of the run
+        :param tag: query text, or None
+        :param trends_class: Trends subclass of the query
+        :param query: arguments of the query
+        :param trends: the parsed Trends object when the page had no trending entries, None when it failed
+        :return:
+        """
+        with self._lock:
+            self.failed += 1
+        if self.skipped is not None:
+            self.skipped(trends_class, query, trends)
+        if trends is not None:
+            print(trends.get_empty_message(), file=self.err)
+        if tag is not None:
+            print("ERROR: Skipping query: {}".format(tag), file=self.err)
+
+    def run_fetch_worker(self, stats, jobs, pages, results, remaining):
+        while True:
+            start = time.perf_counter()
+            job = jobs.get()
+            fetched = time.perf_counter()
+            if job is None:
+                stats.add(idle=fetched - start)
+                break
+            if self.stopping.is_set():
+                continue
+
+            tag, trends_class, query = job
+            try:
+                page, span = self.fetch(trends_class, query)
+            except requests.exceptions.RequestException as e:
+                print("ERROR: Could not get the requested page: {}".format(trends_class.build_url(**query)),
+                      file=self.err)
+                print(utils.get_traceback_string(e), file=self.err)
+                stats.add(items=1, busy=time.perf_counter() - fetched, idle=fetched - start)
+                self.skip(tag, trends_class, query)
+                continue
+            except Exception as e:
+                print("ERROR: Could not get the requested page: {}".format(trends_class.build_url(**query)),
+                      file=self.err)
+                print(utils.get_traceback_string(e), file=self.err)
+                stats.add(items=1, busy=time.perf_counter() - fetched, idle=fetched - start)
+                self.skip(tag, trends_class, query)
+                continue
+
+            done = time.perf_counter()
+            pages.put((tag, trends_class, query, page, span))
+            stats.add(items=1, busy=done - fetched, idle=fetched - start, blocked=time.perf_counter() - done,
+                      queue_size=pages.qsize())
+
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(self.parse_workers):
+                pages.put(None)
+
+    def run_parse_worker(self, stats, pages, results, remaining, executor):
+        while True:
+            start = time.perf_counter()
+            item = pages.get()
+            received = time.perf_counter()
+            if item is None:
+                stats.add(idle=received - start)
+                break
+            if self.stopping.is_set():
+                continue
+
+            tag, trends_class, query, page, span = item
+            try:
+                trends = self.parse(trends_class, query, page, executor)
+            except SystemExit:
+                stats.add(items=1, busy=time.perf_counter() - received, idle=received - start)
+                self.skip(tag, trends_class, query)
+                continue
+            except Exception as e:
+                print("ERROR: Could not parse elements of the GitHub page", file=self.err)
+                print(utils.get_traceback_string(e), file=self.err)
+                stats.add(items=1, busy=time.perf_counter() - received, idle=received - start)
+                self.skip(tag, trends_class, query)
+                continue
+            if trends.empty:
+                stats.add(items=1, busy=time.perf_counter() - received, idle=received - start)
+                self.skip(tag, trends_class, query, trends)
+                continue
+            if span is not None:
+                trends.profile.spans.insert(0, span)
+
+            done = time.perf_counter()
+            results.put((tag, trends))
+            stats.add(items=1, busy=done - received, idle=received - start, blocked=time.perf_counter() - done,
+                      queue_size=results.qsize())
+
+        with self._lock:
+            remaining[1] -= 1
+            last = remaining[1] == 0
+        if last:
+            results.put(None)
+
+    def run(self, jobs, write, skipped=None):
+        """
+        Fetch, parse and write every query. Pages are written in the order they finish parsing.
+        Queries whose page cannot be fetched or parsed, or has no trending entries, are skipped and counted in failed.
+        When write raises, the workers stop taking new queries and have finished before the error is passed on.
+        :param jobs: list of (query text or None, Trends subclass, query arguments) tuples
+        :param write: function called with the query text and the parsed Trends object of every page, from the
+                      calling thread
+        :param skipped: Optional function called with the Trends subclass and arguments of every skipped query, and
+                        the parsed Trends object when the page had no trending entries or None when it failed, from
+                        the worker threads
+        :return: number of queries skipped
+        """
+        fetch_stats = StageStats("fetch", self.fetch_workers)
+        parse_stats = StageStats("parse", self.parse_workers)
+        write_stats = StageStats("write", 1)
+        self.stages = [fetch_stats, parse_stats, write_stats]
+
+        job_queue = queue.Queue()
+        for job in jobs:
+            job_queue.put(job)
+        for _ in range(self.fetch_workers):
+            job_queue.put(None)
+        pages = queue.Queue(maxsize=self.queue_size)
+        results = queue.Queue(maxsize=self.queue_size)
+        remaining = [self.fetch_workers, self.parse_workers]
+
+        executor = ProcessPoolExecutor(max_workers=self.parse_workers) if self.processes else None
+        self.skipped = skipped
+        self.stopping.clear()
+        finished = False
+        start = time.perf_counter()
+        try:
+            for index in range(self.fetch_workers):
+                threading.Thread(target=self.run_fetch_worker,
+                                 args=(fetch_stats, job_queue, pages, results, remaining),
+                                 name="git-trend-fetch-{}".format(index), daemon=True).start()
+            for index in range(self.parse_workers):
+                threading.Thread(target=self.run_parse_worker,
+                                 args=(parse_stats, pages, results, remaining, executor),
+                                 name="git-trend-parse-{}".format(index), daemon=True).start()
+
+            while True:
+                waiting = time.perf_counter()
+                item = results.get()
+                received = time.perf_counter()
+                if item is None:
+                    write_stats.add(idle=received - waiting)
+                    finished = True
+                    break
+                tag, trends = item
+                write(tag, trends)
+                write_stats.add(items=1, busy=time.perf_counter() - received, idle=received - waiting)
+        finally:
+            if not finished:
+                # Writing failed or was interrupted: let the workers discard what is left, and take their results
+                # off the queue so none of them stays blocked on a full queue
+                self.stopping.set()
+                while results.get() is not None:
+                    pass
+            self.elapsed = time.perf_counter() - start
+            if executor is not None:
+                executor.shutdown()
+        return self.failed
+
+    def report(self):
+        """
+        Get the utilization of every stage of the last run, to find the one that limits throughput.
+        Busy is the time spent working, idle the time spent waiting for input and blocked the time spent waiting for
+        room in a full output queue.
+        :return: table as a string
+        """
+        rows = [[stats.name, stats.workers, stats.items, "{:.4f}".format(stats.busy), "{:.4f}".format(stats.idle),
+                 "{:.4f}".format(stats.blocked), stats.max_queue,
+                 "{:.1f}%".format(100 * stats.get_utilization(self.elapsed))]
+                for stats in self.stages]
+        return "{}\nElapsed: {:.4f}s".format(
+            render.render_table(["Stage", "Workers", "Items", "Busy s", "Idle s", "Blocked s", "Max queue",
+                                 "Utilization"], rows),
+            self.elapsed)
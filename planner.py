@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import threading
+import time
+
+DEFAULT_BUDGET = 600
+DEMAND_HALF_LIFE = 7 * 86400
+MAX_STALENESS = 7 * 86400
+BUDGET_WINDOW = 3600
+
+
+class SweepPlanner:
+    def __init__(self, cache, path=None, budget=DEFAULT_BUDGET, half_life=DEMAND_HALF_LIFE):
+        """
+        Choose which trending pages to refresh within a request budget.
+        Every page is scored by how long its cached result has been expired, how often it changed when it was
+        fetched before and how often it is requested, so popular pages that change often are refreshed first and
+        rarely requested, rarely changing pages wait. Pages whose cached result is still fresh, or recently found
+        empty, are left out.
+        The request and change history is kept in a JSON file next to the cache.
+        :param cache: ResultCache holding the results to refresh
+        :param path: File to keep the history in, defaults to planner.json in the cache directory
+        :param budget: Number of pages that may be fetched per hour
+        :param half_life: Seconds after which a request counts half as much towards the demand for a page
+        """
+        self.cache = cache
+        self.path = path or os.path.join(cache.directory, "planner.json")
+        self.budget = budget
+        self.half_life = half_life
+        self.state = self.load()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the history saved by earlier runs
+        :return: dict with the per-URL history and the requests spent in the last hour
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("urls", {})
+        state.setdefault("fetched", [])
+        return state
+
+    def save(self):
+        """
+        Write the history, replacing the previous file atomically
+        :return:
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, threading.get_ident())
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def get_history(self, url):
+        """
+        Get the request and change history of a page, creating it on first use. Callers must hold the lock.
+        :param url: URL of the trending page
+        :return: history dict
+        """
+        return self.state["urls"].setdefault(url, {"demand": 0.0, "demand_at": 0.0, "checks": 0, "changes": 0})
+
+    def get_demand(self, history, now):
+        """
+        Get the number of requests for a page, with older requests counting exponentially less
+        :param history: history of the page
+        :param now: current time
+        :return: decayed request count
+        """
+        return history["demand"] * math.pow(0.5, (now - history["demand_at"]) / self.half_life)
+
+    def record_request(self, url, now=None):
+        """
+        Count a request for a page made from the CLI or the library
+        :param url: URL of the trending page
+        :param now: time of the request, defaults to now
+        :return:
+        """
+        now = now or time.time()
+        with self._lock:
+            history = self.get_history(url)
+            history["demand"] = self.get_demand(history, now) + 1
+            history["demand_at"] = now
+
+    def record_check(self, url, changed):
+        """
+        Count a fresh download of a page, and whether it had changed since it was last parsed
+        :param url: URL of the trending page
+        :param changed: whether the page differed from the last one parsed
+        :return:
+        """
+        with self._lock:
+            history = self.get_history(url)
+            history["checks"] += 1
+            history["changes"] += int(changed)
+
+    def spend(self, requests, now=None):
+        """
+        Count requests made against the budget of the current hour
+        :param requests: number of requests
+        :param now: time of the requests, defaults to now
+        :return:
+        """
+        if requests:
+            with self._lock:
+                self.state["fetched"].append([now or time.time(), requests])
+
+    def get_remaining_budget(self, now=None):
+        """
+        Get the number of pages that may still be fetched in the current hour
+        :param now: current time, defaults to now
+        :return: remaining number of fetches
+        """
+        now = now or time.time()
+        with self._lock:
+            self.state["fetched"] = [spent for spent in self.state["fetched"] if spent[0] > now - BUDGET_WINDOW]
+            return max(0, self.budget - sum(requests for _, requests in self.state["fetched"]))
+
+    def get_score(self, url, now=None):
+        """
+        Score how worthwhile refreshing a page is: the hours its cached result has been expired, times the share of
+        earlier fetches that found it changed, times one plus its demand
+        :param url: URL of the trending page
+        :param now: current time, defaults to now
+        :return: score, or None when the cached result does not need refreshing yet
+        """
+        now = now or time.time()
+        age = self.cache.get_age(url)
+        if age is None:
+            expired = MAX_STALENESS
+        else:
+            seconds, empty = age
+            expired = seconds - (self.cache.empty_ttl if empty else self.cache.ttl)
+            if expired <= 0:
+                return None
+
+        with self._lock:
+            history = self.state["urls"].get(url)
+            if history is None:
+                change_rate, demand = 0.5, 0.0
+            else:
+                change_rate = (history["changes"] + 1) / (history["checks"] + 2)
+                demand = self.get_demand(history, now)
+        return min(expired, MAX_STALENESS) / 3600 * change_rate * (1 + demand)
+
+    def plan(self, jobs, now=None):
+        """
+        Order queries by score and keep as many as the remaining budget allows
+        :param jobs: list of (query text or None, Trends subclass, query arguments) tuples
+        :param now: current time, defaults to now
+        :return: list of (score, job) tuples of the queries to refresh, highest score first
+        """
+        now = now or time.time()
+        scored = []
+        for job in jobs:
+            _, trends_class, query = job
+            score = self.get_score(trends_class.build_url(**query), now)
+            if score is not None:
+                scored.append((score, job))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:self.get_remaining_budget(now)]
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+
+DEFAULT_MIN_INTERVAL = 300
+DEFAULT_MAX_INTERVAL = 6 * 3600
+BACKOFF = 1.5
+FAILURE_BACKOFF = 2
+HOUR_DECAY = 0.9
+REGENERATION_SAMPLES = 3
+REGENERATION_SHARE = 0.5
+REGENERATION_DELAY = 120
+
+
+class PollSchedule:
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, path=None):
+        """
+        Polling interval of every trending page, adapted to how often its list actually changes.
+        A list is considered changed when its entries or their order differ from the previous poll. Every change
+        halves the interval of the page and every unchanged poll makes it 1.5 times longer, within the bounds.
+        The hours of the day (UTC) at which changes are seen are also counted, and once most changes of a page fall
+        in the same hour, the next poll is moved to just after that hour when it comes before the regular one.
+        Polls that fail back off exponentially instead, without changing the learned interval.
+        :param min_interval: Shortest time between two polls of a page, in seconds
+        :param max_interval: Longest time between two polls of a page, in seconds
+        :param path: Optional JSON file to keep the learned intervals in across runs
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.path = path
+        self.pages = self.load()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the intervals learned by earlier runs
+        :return: dict of URL to polling state
+        """
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Write the learned intervals, replacing the previous file atomically
+        :return:
+        """
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, threading.get_ident())
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.pages, f)
+        os.replace(tmp_path, self.path)
+
+    def get_page(self, url):
+        """
+        Get the polling state of a page, creating it on first use. Callers must hold the lock.
+        :param url: URL of the trending page
+        :return: state dict
+        """
+        page = self.pages.setdefault(url, {"interval": self.min_interval, "next_poll": 0.0, "keys": None,
+                                           "polls": 0, "changes": 0, "hours": [0.0] * 24})
+        page.setdefault("failures", 0)
+        page["interval"] = min(max(page["interval"], self.min_interval), self.max_interval)
+        return page
+
+    def is_due(self, url, now=None):
+        """
+        Check whether a page should be polled
+        :param url: URL of the trending page
+        :param now: current time, defaults to now
+        :return: True if its next poll time has passed
+        """
+        with self._lock:
+            return self.get_page(url)["next_poll"] <= (now or time.time())
+
+    def get_wait(self, urls, now=None):
+        """
+        Get the time until the next page is due
+        :param urls: URLs of the polled pages
+        :param now: current time, defaults to now
+        :return: seconds to wait, 0 when a page is already due
+        """
+        now = now or time.time()
+        with self._lock:
+            return max(0.0, min(self.get_page(url)["next_poll"] for url in urls) - now)
+
+    def start(self, url, now=None):
+        """
+        Push back the next poll of a page by its current interval before polling it, so a poll that fails is
+        retried on the usual schedule rather than immediately
+        :param url: URL of the trending page
+        :param now: time of the poll, defaults to now
+        :return:
+        """
+        now = now or time.time()
+        with self._lock:
+            page = self.get_page(url)
+            page["next_poll"] = now + page["interval"]
+
+    def get_regeneration_hour(self, page):
+        """
+        Get the hour of the day (UTC) in which most changes of a page were seen, once there is enough evidence
+        :param page: polling state of the page
+        :return: hour between 0 and 23, or None
+        """
+        total = sum(page["hours"])
+        if total < REGENERATION_SAMPLES:
+            return None
+        hour = max(range(24), key=lambda index: page["hours"][index])
+        if page["hours"][hour] < REGENERATION_SHARE * total:
+            return None
+        return hour
+
+    def get_next_poll(self, page, now):
+        """
+        Get the time of the next poll of a page: after its interval, or just after the hour its list is usually
+        regenerated in when that comes first
+        :param page: polling state of the page
+        :param now: time of the last poll
+        :return: timestamp
+        """
+        next_poll = now + page["interval"]
+        hour = self.get_regeneration_hour(page)
+        if hour is None:
+            return next_poll
+        regeneration = now - now % 86400 + hour * 3600 + REGENERATION_DELAY
+        while regeneration < now + self.min_interval:
+            regeneration += 86400
+        return min(next_poll, regeneration)
+
+    def record(self, url, keys, cached=False, now=None):
+        """
+        Record the result of a poll and schedule the next one
+        :param url: URL of the trending page
+        :param keys: keys of the trending entries, in rank order
+        :param cached: whether the result was served from the cache, which says nothing about the change rate
+        :param now: time of the poll, defaults to now
+        :return: True if the list changed since the previous poll, or was polled for the first time
+        """
+        now = now or time.time()
+        with self._lock:
+            page = self.get_page(url)
+            first = page["keys"] is None
+            changed = not first and keys != page["keys"]
+            page["keys"] = keys
+            page["failures"] = 0
+            if not first and not cached:
+                page["polls"] += 1
+                if changed:
+                    page["changes"] += 1
+                    page["interval"] = max(self.min_interval, page["interval"] / 2)
+                    page["hours"] = [count * HOUR_DECAY for count in page["hours"]]
+                    page["hours"][int(now % 86400 // 3600)] += 1
+                else:
+                    page["interval"] = min(self.max_interval, page["interval"] * BACKOFF)
+            page["next_poll"] = self.get_next_poll(page, now)
+            return first or changed
+
+    def record_failure(self, url, now=None):
+        """
+        Record a poll that failed, such as an error status, rate limiting or a timeout, and schedule the next one.
+        A failure says nothing about how often the list changes, so the learned interval is kept, but every failure
+        in a row doubles the wait before the next poll, up to the longest interval, so a struggling or throttling
+        server is not polled again at the usual rate.
+        :param url: URL of the trending page
+        :param now: time of the poll, defaults to now
+        :return: seconds until the next poll
+        """
+        now = now or time.time()
+        with self._lock:
+            page = self.get_page(url)
+            page["failures"] += 1
+            wait = min(self.max_interval, page["interval"] * FAILURE_BACKOFF ** page["failures"])
+            page["next_poll"] = now + wait
+            return wait
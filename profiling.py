@@ -0,0 +1,53 @@
+import time
+from contextlib import contextmanager
+
+
+class Profile:
+    def __init__(self):
+        """
+        Lightweight record of the time spent in each stage of fetching, parsing and printing trends
+        """
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the enclosed block as a named stage.
+        The yielded dict can be updated with counts (bytes, items) known only once the stage has run.
+        :param name: Name of the stage
+        :param attributes: Initial attributes for the stage
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.spans.append({
+                "stage": name,
+                "seconds": time.perf_counter() - start,
+                "attributes": attributes
+            })
+
+    def as_dict(self):
+        """
+        Get the recorded stages as structured data, suitable for exporting from a service
+        :return: dict with the total time and the list of stages in the order they finished
+        """
+        return {
+            "total_seconds": sum(span["seconds"] for span in self.spans),
+            "stages": [dict(span, attributes=dict(span["attributes"])) for span in self.spans]
+        }
+
+    def render(self):
+        """
+        Get a human readable breakdown of the recorded stages
+        :return: breakdown as a string
+        """
+        total = sum(span["seconds"] for span in self.spans) or 1.0
+        lines = ["{:<14} {:>10} {:>7}  {}".format("Stage", "Seconds", "Share", "Details")]
+        for span in self.spans:
+            details = ", ".join("{}={}".format(k, v) for k, v in span["attributes"].items())
+            lines.append("{:<14} {:>10.4f} {:>6.1f}%  {}".format(
+                span["stage"], span["seconds"], 100 * span["seconds"] / total, details))
+        lines.append("{:<14} {:>10.4f}".format("total", sum(span["seconds"] for span in self.spans)))
+        return "\n".join(lines)
@@ -0,0 +1,98 @@
+import os
+import sys
+import unicodedata
+
+from enums import Colors
+
+COLOR_CODES = {
+    Colors.GREEN: "32",
+    Colors.RED: "31",
+    Colors.BLUE: "34",
+    Colors.YELLOW: "33",
+}
+
+
+def use_colors(out):
+    """
+    Decide whether ANSI colors should be written to a stream.
+    Colors are used for terminals only, honouring the NO_COLOR and FORCE_COLOR conventions.
+    :param out: stream the output is written to
+    :return: True if colors should be used
+    """
+    if "NO_COLOR" in os.environ:
+        return False
+    if "FORCE_COLOR" in os.environ:
+        return True
+    isatty = getattr(out, "isatty", None)
+    return bool(isatty and isatty())
+
+
+def colorize(text, color, enabled):
+    """
+    Wrap text in the ANSI escape codes for a color
+    :param text: text to color
+    :param color: Colors value to use
+    :param enabled: return the text unchanged when False
+    :return: colored text
+    """
+    if not enabled:
+        return text
+    return "\033[{}m{}\033[0m".format(COLOR_CODES[color], text)
+
+
+def display_width(text):
+    """
+    Get the number of terminal columns needed to display text, counting wide East Asian characters twice
+    :param text: text to measure
+    :return: display width
+    """
+    if len(text.encode("utf-8")) == len(text):
+        return len(text)
+    width = 0
+    for char in text:
+        if unicodedata.combining(char):
+            continue
+        width += 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+    return width
+
+
+def render_table(field_names, rows):
+    """
+    Render rows as a left aligned table with borders.
+    Column widths are computed in a single pass over the rows and the table is built as one string.
+    :param field_names: column headers
+    :param rows: list of rows, each a list of values in column order
+    :return: the rendered table
+    """
+    rows = [[str(value) for value in row] for row in rows]
+    widths = [display_width(name) for name in field_names]
+    row_widths = []
+    for row in rows:
+        cell_widths = [display_width(value) for value in row]
+        row_widths.append(cell_widths)
+        widths = [max(width, cell_width) for width, cell_width in zip(widths, cell_widths)]
+
+    rule = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+
+    def line(values, value_widths):
+        return "|" + "|".join(
+            " {}{} ".format(value, " " * (width - value_width))
+            for value, value_width, width in zip(values, value_widths, widths)
+        ) + "|"
+
+    lines = [rule, line(field_names, [display_width(name) for name in field_names]), rule]
+    lines.extend(line(row, cell_widths) for row, cell_widths in zip(rows, row_widths))
+    lines.append(rule)
+    return "\n".join(lines)
+
+
+def write(text, out=None):
+    """
+    Write rendered output with a single call
+    :param text: rendered output, without the trailing newline
+    :param out: stream to write to, defaults to the current sys.stdout
+    :return:
+    """
+    out = out or sys.stdout
+    out.write(text + "\n")
+    out.flush()
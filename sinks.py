@@ -0,0 +1,228 @@
+import json
+from collections import OrderedDict
+
+import aggregate
+import columnar
+import metrics
+from enums import Formats
+from writers import STREAMING_FORMATS, RecordWriter
+
+DEFAULT_BUFFER_SIZE = 500
+
+
+class Sink:
+    """
+    Destination for parsed trending data. Every page is parsed once and each of its entries is handed to every sink.
+    """
+
+    def begin(self, trends, tag=None):
+        """
+        Called before the entries of a page are written
+        :param trends: Trends object being parsed
+        :param tag: query the page belongs to in batch mode, or None
+        :return:
+        """
+
+    def write(self, key, value):
+        """
+        Called with every entry of the page, as soon as it is extracted
+        :param key: key of the entry
+        :param value: fields of the entry
+        :return:
+        """
+
+    def end(self, trends, tag=None):
+        """
+        Called once every entry of the page has been written
+        :param trends: parsed Trends object
+        :param tag: query the page belongs to in batch mode, or None
+        :return:
+        """
+
+    def close(self):
+        """
+        Called once every page of the run has been written
+        :return:
+        """
+
+
+class RecordSink(Sink):
+    def __init__(self, format_, out, fieldnames, buffer_size=1):
+        """
+        Write entries as NDJSON lines or CSV rows as they are extracted
+        :param format_: streaming output format to use
+        :param out: text stream to write to
+        :param fieldnames: CSV columns, in order
+        :param buffer_size: number of records written between flushes of the stream
+        """
+        self.writer = RecordWriter(format_, out, fieldnames)
+        self.buffer_size = buffer_size
+        self.pending = 0
+        self.trends = None
+        self.tag = None
+
+    def begin(self, trends, tag=None):
+        self.trends = trends
+        self.tag = tag
+
+    def write(self, key, value):
+        record = self.trends.get_record(key, value)
+        if self.tag is not None:
+            record = dict(query=self.tag, **record)
+        self.writer.write(record)
+        self.pending += 1
+        if self.pending >= self.buffer_size:
+            self.writer.flush()
+            self.pending = 0
+
+    def end(self, trends, tag=None):
+        self.writer.flush()
+        self.pending = 0
+
+
+class PrintSink(Sink):
+    def __init__(self, format_, out, batch=False):
+        """
+        Print each parsed page in one of the formats of Trends.print once it is complete.
+        In batch mode JSON output is collected into a single document keyed by query, and the other formats print a
+        header line before each query.
+        :param format_: output format to use
+        :param out: text stream to write to
+        :param batch: whether pages belong to batch queries
+        """
+        self.format = format_
+        self.out = out
+        self.batch = batch
+        self.tagged = OrderedDict()
+
+    def end(self, trends, tag=None):
+        if self.batch and self.format in (Formats.JSON, Formats.JSON_COMPACT):
+            self.tagged[tag] = trends.get_json_data()
+            return
+        if tag is not None:
+            print("==> {} <==".format(tag), file=self.out)
+        trends.print(format_=self.format, out=self.out)
+
+    def close(self):
+        if not self.batch or self.format not in (Formats.JSON, Formats.JSON_COMPACT):
+            return
+        if self.format == Formats.JSON:
+            print(json.dumps(self.tagged, indent=4), file=self.out)
+        else:
+            print(json.dumps(self.tagged, separators=(",", ":")), file=self.out)
+
+
+class TopKSink(Sink):
+    def __init__(self, k, format_, out):
+        """
+        Merge every parsed page into a single deduplicated top K ranking, printed at the end of the run
+        :param k: number of entries to keep
+        :param format_: output format to use
+        :param out: text stream to write to
+        """
+        self.k = k
+        self.format = format_
+        self.out = out
+        self.results = []
+
+    def end(self, trends, tag=None):
+        self.results.append(trends)
+
+    def close(self):
+        if not self.results:
+            return
+        aggregate.print_top_k(aggregate.top_k(self.results, self.k), self.format, self.results[0].key_field, self.out)
+
+
+class ParquetSink(Sink):
+    def __init__(self, path):
+        """
+        Append every parsed page to a partitioned Parquet dataset at the end of the run
+        :param path: Directory of the dataset
+        """
+        columnar.check_pyarrow()
+        self.path = path
+        self.batches = []
+
+    def end(self, trends, tag=None):
+        self.batches.append(columnar.to_record_batch(trends))
+
+    def close(self):
+        columnar.write_parquet(self.path, self.batches)
+
+
+class StoreSink(Sink):
+    def __init__(self, snapshot_store):
+        """
+        Save a snapshot of every freshly parsed page
+        :param snapshot_store: SnapshotStore to add snapshots to
+        """
+        self.snapshot_store = snapshot_store
+
+    def end(self, trends, tag=None):
+        if not trends.cached and not trends.unchanged:
+            self.snapshot_store.add(trends)
+
+
+class MetricsSink(Sink):
+    def __init__(self, textfile=None):
+        """
+        Update the run metrics from every parsed page
+        :param textfile: optional path of a node_exporter textfile to write at the end of the run
+        """
+        self.textfile = textfile
+
+    def end(self, trends, tag=None):
+        metrics.record(trends)
+
+    def close(self):
+        if self.textfile:
+            metrics.write_textfile(self.textfile)
+
+
+class PlannerSink(Sink):
+    def __init__(self, planner):
+        """
+        Record for the sweep planner whether every freshly downloaded page had changed
+        :param planner: SweepPlanner to update
+        """
+        self.planner = planner
+
+    def end(self, trends, tag=None):
+        if not trends.cached and trends.page_digest is not None:
+            self.planner.record_check(trends.get_url(), changed=not trends.unchanged)
+
+
+def create_sink(format_, out, fieldnames, batch=False, buffer_size=1):
+    """
+    Create the sink for an output format
+    :param format_: output format to use
+    :param out: text stream to write to, or the dataset directory for parquet
+    :param fieldnames: columns of streamed records
+    :param batch: whether pages belong to batch queries
+    :param buffer_size: number of streamed records written between flushes
+    :return: Sink
+    """
+    if format_ == Formats.PARQUET:
+        return ParquetSink(out)
+    if format_ in STREAMING_FORMATS:
+        return RecordSink(format_, out, fieldnames, buffer_size=buffer_size)
+    return PrintSink(format_, out, batch=batch)
+
+
+def fan_out(trends, sinks, tag=None, parsed=False):
+    """
+    Parse a page once and hand every entry to each sink
+    :param trends: Trends object to parse
+    :param sinks: list of Sinks
+    :param tag: query the page belongs to in batch mode, or None
+    :param parsed: whether the page was already parsed, by an earlier stage of a pipeline
+    :return:
+    """
+    for sink in sinks:
+        sink.begin(trends, tag)
+    for key, value in trends.get_json_data().items() if parsed else trends.iter_parse():
+        for sink in sinks:
+            sink.write(key, value)
+    for sink in sinks:
+        sink.end(trends, tag)
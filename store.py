@@ -0,0 +1,365 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import render
+import utils
+from graph import TrendGraph
+from enums import Colors, Formats
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".local", "share", "git-trend", "trends.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    language TEXT NOT NULL,
+    spoken_language TEXT NOT NULL,
+    period TEXT NOT NULL,
+    taken_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_url_taken_at ON snapshots (url, taken_at);
+
+CREATE TABLE IF NOT EXISTS entries (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    key TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    rank INTEGER NOT NULL,
+    stars INTEGER,
+    stars_gained INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_key_taken_at ON entries (key, taken_at);
+
+CREATE TABLE IF NOT EXISTS entry_stats (
+    key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    language TEXT NOT NULL,
+    period TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    appearances INTEGER NOT NULL,
+    seconds_on_list REAL NOT NULL,
+    peak_rank INTEGER NOT NULL,
+    last_rank INTEGER NOT NULL,
+    first_stars INTEGER,
+    first_stars_at REAL,
+    last_stars INTEGER,
+    last_stars_at REAL,
+    PRIMARY KEY (key, url)
+);
+
+CREATE TABLE IF NOT EXISTS entry_descriptions (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    content_type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entry_descriptions_last_seen ON entry_descriptions (last_seen);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS description_index USING fts5 (
+    key, description, content='entry_descriptions', content_rowid='id', tokenize='unicode61'
+);
+"""
+
+
+class SnapshotStore:
+    def __init__(self, path=None, shared=False):
+        """
+        SQLite store of trending snapshots with aggregates per entry and list that are updated on insert
+        :param path: Path of the database file
+        :param shared: whether the store is kept open and used by several threads, one at a time
+        """
+        self.path = path or DEFAULT_STORE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=not shared)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite was built without FTS5; snapshots are still stored but cannot be searched
+            self.has_fts = False
+        self.graph = TrendGraph(self.connection)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, trends, taken_at=None):
+        """
+        Store a snapshot of parsed trends and update the aggregates of every entry in it
+        :param trends: parsed Trends object
+        :param taken_at: time of the snapshot, defaults to now
+        :return: id of the new snapshot
+        """
+        taken_at = taken_at or time.time()
+        url = trends.get_url()
+        language = trends.language or ""
+
+        with self.connection:
+            previous = self.connection.execute(
+                "SELECT MAX(taken_at) FROM snapshots WHERE url = ?", (url,)).fetchone()[0]
+            snapshot_id = self.connection.execute(
+                "INSERT INTO snapshots (url, content_type, language, spoken_language, period, taken_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, trends.content_type.value, language, trends.spoken_language or "", trends.period, taken_at)
+            ).lastrowid
+
+            for key, value in trends.trending.items():
+                rank = value["rank"]
+                stars = utils.parse_count(value.get("stars", ""))
+                stars_gained = utils.parse_count(value.get("stars_gained", ""))
+                self.connection.execute(
+                    "INSERT INTO entries (snapshot_id, key, taken_at, rank, stars, stars_gained) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (snapshot_id, key, taken_at, rank, stars, stars_gained)
+                )
+                self.update_stats(key, url, trends, language, taken_at, previous, rank, stars)
+                if self.has_fts:
+                    self.update_description(key, trends.content_type.value, value.get("description", ""), taken_at)
+
+            self.graph.add(trends, taken_at)
+
+        return snapshot_id
+
+    def update_stats(self, key, url, trends, language, taken_at, previous, rank, stars):
+        """
+        Fold one appearance into the running aggregates of an entry on a list.
+        Time on the list only accumulates between consecutive snapshots that both contain the entry.
+        """
+        row = self.connection.execute(
+            "SELECT last_seen FROM entry_stats WHERE key = ? AND url = ?", (key, url)).fetchone()
+        if row is None:
+            self.connection.execute(
+                "INSERT INTO entry_stats (key, url, content_type, language, period, first_seen, last_seen, "
+                "appearances, seconds_on_list, peak_rank, last_rank, first_stars, first_stars_at, last_stars, "
+                "last_stars_at) VALUES (?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?, ?, ?, ?)",
+                (key, url, trends.content_type.value, language, trends.period, taken_at, taken_at, rank, rank,
+                 stars, taken_at if stars is not None else None, stars, taken_at if stars is not None else None)
+            )
+            return
+
+        continuous = previous is not None and row["last_seen"] == previous
+        self.connection.execute(
+            "UPDATE entry_stats SET last_seen = ?, appearances = appearances + 1, "
+            "seconds_on_list = seconds_on_list + ?, peak_rank = MIN(peak_rank, ?), last_rank = ?, "
+            "first_stars = COALESCE(first_stars, ?), first_stars_at = COALESCE(first_stars_at, ?), "
+            "last_stars = COALESCE(?, last_stars), last_stars_at = COALESCE(?, last_stars_at) "
+            "WHERE key = ? AND url = ?",
+            (taken_at, taken_at - previous if continuous else 0, rank, rank,
+             stars, taken_at if stars is not None else None,
+             stars, taken_at if stars is not None else None, key, url)
+        )
+
+    def update_description(self, key, content_type, description, taken_at):
+        """
+        Keep the full-text index in step with the latest description of an entry.
+        The index only changes when a new entry appears or its description changes, not on every snapshot.
+        """
+        row = self.connection.execute(
+            "SELECT id, description FROM entry_descriptions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            rowid = self.connection.execute(
+                "INSERT INTO entry_descriptions (key, content_type, description, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?)", (key, content_type, description, taken_at, taken_at)).lastrowid
+            self.connection.execute(
+                "INSERT INTO description_index (rowid, key, description) VALUES (?, ?, ?)",
+                (rowid, key, description))
+            return
+
+        if row["description"] != description:
+            self.connection.execute(
+                "INSERT INTO description_index (description_index, rowid, key, description) "
+                "VALUES ('delete', ?, ?, ?)", (row["id"], key, row["description"]))
+            self.connection.execute(
+                "INSERT INTO description_index (rowid, key, description) VALUES (?, ?, ?)",
+                (row["id"], key, description))
+        self.connection.execute(
+            "UPDATE entry_descriptions SET description = ?, last_seen = ? WHERE id = ?",
+            (description, taken_at, row["id"]))
+
+    def search(self, query, since=None, limit=20):
+        """
+        Search the descriptions of stored entries, best matches first
+        :param query: words to search for; all of them must match
+        :param since: only include entries seen on a list since this timestamp
+        :param limit: maximum number of results
+        :return: list of dicts with the entry, its latest description and its relevance score
+        """
+        terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+        if not terms:
+            return []
+        rows = self.connection.execute(
+            "SELECT d.key, d.content_type, d.description, d.first_seen, d.last_seen, "
+            "bm25(description_index) AS score "
+            "FROM description_index JOIN entry_descriptions d ON d.id = description_index.rowid "
+            "WHERE description_index MATCH ? AND d.last_seen >= ? ORDER BY score LIMIT ?",
+            (" ".join(terms), since or 0, limit)
+        )
+        return [dict(row, score=round(-row["score"], 4)) for row in rows]
+
+    def get_trajectory(self, key, since=None, until=None):
+        """
+        Get the rank and stars of an entry in every snapshot within a time range, using the (key, taken_at) index
+        :param key: repository (org/repo) or developer name
+        :param since: start of the range as a timestamp
+        :param until: end of the range as a timestamp
+        :return: list of dicts ordered by time
+        """
+        rows = self.connection.execute(
+            "SELECT e.taken_at, e.rank, e.stars, e.stars_gained, s.url, s.language, s.period "
+            "FROM entries e JOIN snapshots s ON s.id = e.snapshot_id "
+            "WHERE e.key = ? AND e.taken_at BETWEEN ? AND ? ORDER BY e.taken_at",
+            (key, since or 0, until or float("inf"))
+        )
+        return [dict(row) for row in rows]
+
+    def get_stats(self, key, since=None):
+        """
+        Get the trajectory and derived statistics of an entry for every list it appeared on.
+        Without since, the statistics are the all-time aggregates kept up to date on insert. With since, they are
+        computed from the snapshots taken since then, and lists the entry was not on in that window are left out.
+        :param key: repository (org/repo) or developer name
+        :param since: only include the trajectory and statistics from this timestamp on
+        :return: dict with one item per list, or None when the entry was never seen
+        """
+        rows = self.connection.execute("SELECT * FROM entry_stats WHERE key = ?", (key,)).fetchall()
+        if not rows:
+            return None
+
+        trajectory = self.get_trajectory(key, since=since)
+        lists = []
+        for row in rows:
+            points = [point for point in trajectory if point["url"] == row["url"]]
+            if since:
+                if not points:
+                    continue
+                row = self.get_window_stats(row["url"], points, since)
+            velocity = None
+            if row["first_stars"] is not None and row["last_stars_at"] > row["first_stars_at"]:
+                hours = (row["last_stars_at"] - row["first_stars_at"]) / 3600
+                velocity = round((row["last_stars"] - row["first_stars"]) / hours, 2)
+            lists.append({
+                "url": row["url"],
+                "language": row["language"] or "all",
+                "period": row["period"],
+                "first_seen": row["first_seen"],
+                "last_seen": row["last_seen"],
+                "appearances": row["appearances"],
+                "hours_on_list": round(row["seconds_on_list"] / 3600, 2),
+                "peak_rank": row["peak_rank"],
+                "last_rank": row["last_rank"],
+                "stars_per_hour": velocity,
+                "trajectory": [
+                    {"taken_at": point["taken_at"], "rank": point["rank"], "stars": point["stars"]}
+                    for point in points
+                ]
+            })
+        return {"key": key, "since": since or None, "lists": lists}
+
+    def get_window_stats(self, url, points, since):
+        """
+        Fold the appearances of an entry on a list within a time window into the same aggregates update_stats
+        keeps for all time. Time on the list only accumulates between consecutive snapshots of the window that
+        both contain the entry.
+        :param url: URL of the list
+        :param points: trajectory of the entry on the list since the start of the window, ordered by time
+        :param since: start of the window as a timestamp
+        :return: dict with the columns of an entry_stats row
+        """
+        taken = [row[0] for row in self.connection.execute(
+            "SELECT taken_at FROM snapshots WHERE url = ? AND taken_at >= ? ORDER BY taken_at", (url, since))]
+        previous = dict(zip(taken[1:], taken))
+        starred = [point for point in points if point["stars"] is not None]
+
+        seconds_on_list = 0
+        last_seen = None
+        for point in points:
+            if last_seen is not None and previous.get(point["taken_at"]) == last_seen:
+                seconds_on_list += point["taken_at"] - last_seen
+            last_seen = point["taken_at"]
+
+        return {
+            "url": url,
+            "language": points[0]["language"],
+            "period": points[0]["period"],
+            "first_seen": points[0]["taken_at"],
+            "last_seen": points[-1]["taken_at"],
+            "appearances": len(points),
+            "seconds_on_list": seconds_on_list,
+            "peak_rank": min(point["rank"] for point in points),
+            "last_rank": points[-1]["rank"],
+            "first_stars": starred[0]["stars"] if starred else None,
+            "first_stars_at": starred[0]["taken_at"] if starred else None,
+            "last_stars": starred[-1]["stars"] if starred else None,
+            "last_stars_at": starred[-1]["taken_at"] if starred else None
+        }
+
+
+def print_stats(stats, format_="default", out=None):
+    """
+    Print the statistics of an entry in the requested output format
+    :param stats: statistics returned by SnapshotStore.get_stats
+    :param format_: output format to use
+    :param out: text stream to write to, defaults to the current sys.stdout
+    :return:
+    """
+    out = out or sys.stdout
+    if format_ == Formats.JSON:
+        print(json.dumps(stats, indent=4), file=out)
+        return
+
+    window = "since {}".format(format_timestamp(stats["since"])) if stats.get("since") else "all time"
+    lines = []
+    if not stats["lists"]:
+        lines.append("➜ {} was not on any list {}".format(stats["key"], window))
+    for item in stats["lists"]:
+        lines.append("➜ {} on {} {} list ({}): peak rank {}, last rank {}, {} appearance(s), {} hour(s) on list, {} star(s)/hour".format(
+            stats["key"], item["period"], item["language"], window, item["peak_rank"], item["last_rank"],
+            item["appearances"], item["hours_on_list"],
+            item["stars_per_hour"] if item["stars_per_hour"] is not None else "<Unknown>"))
+        rows = [[format_timestamp(point["taken_at"]), point["rank"], point["stars"] if point["stars"] is not None else ""]
+                for point in item["trajectory"]]
+        if rows:
+            lines.append(render.render_table(["Time", "Rank", "Stars"], rows))
+    render.write("\n".join(lines), out)
+
+
+def print_search_results(results, format_="default", out=None):
+    """
+    Print search results in the requested output format
+    :param results: results returned by SnapshotStore.search
+    :param format_: output format to use
+    :param out: text stream to write to, defaults to the current sys.stdout
+    :return:
+    """
+    out = out or sys.stdout
+    if format_ == Formats.JSON:
+        print(json.dumps(results, indent=4), file=out)
+        return
+
+    colors = render.use_colors(out)
+    lines = []
+    for result in results:
+        lines.append("➜ {} [{}, last seen {}]:  {}".format(
+            render.colorize(result["key"], Colors.GREEN, colors),
+            render.colorize(result["content_type"], Colors.BLUE, colors),
+            format_timestamp(result["last_seen"]),
+            render.colorize(result["description"] or "<Unknown Description>", Colors.RED, colors)))
+    if lines:
+        render.write("\n".join(lines), out)
+
+
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
@@ -0,0 +1,82 @@
+import json
+import os
+import socket
+import sys
+
+# Only the standard library is imported here, so forwarding a query to a running daemon does not pay for importing
+# the parser and HTTP stack
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".cache", "git-trend", "daemon.sock")
+DEFAULT_CONNECT_TIMEOUT = 5
+
+
+def get_socket_path():
+    """
+    Get the Unix socket the daemon listens on
+    :return: path from the GIT_TREND_SOCKET environment variable, or the default path
+    """
+    return os.environ.get("GIT_TREND_SOCKET") or DEFAULT_SOCKET_PATH
+
+
+def can_forward(argv):
+    """
+    Check whether a command can be run by the daemon. Commands that read stdin, run until interrupted or start the
+    daemon itself always run in this process. The CLI does not accept abbreviated options, so matching the full
+    option names is enough.
+    :param argv: command line arguments, without the program name
+    :return: True if the command can be forwarded
+    """
+    if "daemon" in argv or "--watch" in argv or "--batch=-" in argv:
+        return False
+    if "--batch" in argv:
+        index = argv.index("--batch")
+        if index + 1 == len(argv) or argv[index + 1] == "-" or argv[index + 1].startswith("--"):
+            return False
+    return True
+
+
+def forward(argv, path=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+    """
+    Run a command in the daemon and get its rendered output.
+    Once the command has been sent it may already have written files or the cache, so it is never run again here:
+    when the daemon fails to answer, the error is reported and the client exits.
+    :param argv: command line arguments, without the program name
+    :param path: Unix socket of the daemon, defaults to get_socket_path()
+    :param connect_timeout: seconds to wait for the daemon to accept the connection
+    :return: dict with the stdout and stderr text and the exit code, or None when no daemon is listening
+    """
+    isatty = getattr(sys.stdout, "isatty", None)
+    if "NO_COLOR" in os.environ:
+        colors = False
+    else:
+        colors = "FORCE_COLOR" in os.environ or bool(isatty and isatty())
+    request = {"argv": argv, "cwd": os.getcwd(), "colors": colors}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(connect_timeout)
+        try:
+            connection.connect(path or get_socket_path())
+        except OSError:
+            return None
+
+        # A command runs as long as it needs to, as it would in-process
+        connection.settimeout(None)
+        try:
+            connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with connection.makefile("rb") as reply:
+                return json.loads(reply.readline().decode("utf-8"))
+        except (OSError, ValueError) as e:
+            print("ERROR: The git-trend daemon did not answer the command: {}".format(e))
+            exit(1)
+
+
+def cli():
+    argv = sys.argv[1:]
+    reply = forward(argv) if can_forward(argv) else None
+    if reply is None:
+        import trending
+        trending.cli()
+        return
+
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    exit(reply["code"])
@@ -0,0 +1,135 @@
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import traceback
+
+import requests
+
+import trend_client
+import pipeline
+import trending
+
+
+class CapturedOutput(io.StringIO):
+    def __init__(self, colors=False):
+        """
+        Text stream collecting the output of a command for the client, reporting a terminal when the client writes
+        to one so the output is colored the same way as in the client's process
+        :param colors: whether the client's output should be colored
+        """
+        super().__init__()
+        self.colors = colors
+
+    def isatty(self):
+        return self.colors
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+        except ValueError:
+            return
+        reply = self.server.run(request["argv"], request["cwd"], colors=request.get("colors", False))
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # A Unix socket refuses connections outright once its backlog is full, which would send clients that arrive
+    # together back to running in-process
+    request_queue_size = 128
+
+    def __init__(self, path=None):
+        """
+        Long-running git-trend process answering commands forwarded by the CLI over a Unix socket.
+        Modules are imported once and HTTP connections to GitHub are kept alive in a single session across commands,
+        so a forwarded query costs the client no interpreter warm-up or TLS handshake.
+        Commands run one at a time, as they share the session and the snapshot stores kept open by the graph command.
+        Each command writes to its own captured streams and resolves relative paths against the client's working
+        directory, so nothing process-wide changes while it runs and background refreshes it leaves running cannot
+        write into the output of the next one.
+        :param path: Unix socket to listen on, defaults to trend_client.get_socket_path()
+        """
+        self.path = path or trend_client.get_socket_path()
+        self.session = requests.Session()
+        # Keep a pooled connection for every fetch worker of --pipeline
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pipeline.DEFAULT_FETCH_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.path.exists(self.path):
+            if is_listening(self.path):
+                print("ERROR: A git-trend daemon is already listening on {}".format(self.path))
+                exit(1)
+            # Left behind by a daemon that did not shut down cleanly
+            os.unlink(self.path)
+        # bind creates the socket with the permissions the umask leaves, so other users cannot connect to it even
+        # for a moment before a chmod
+        umask = os.umask(0o077)
+        try:
+            super().__init__(self.path, DaemonHandler)
+        finally:
+            os.umask(umask)
+
+    def run(self, argv, cwd, colors=False):
+        """
+        Run a command as the CLI would and capture what it prints
+        :param argv: command line arguments, without the program name
+        :param cwd: working directory of the client, relative paths are resolved against it
+        :param colors: whether the client's output should be colored
+        :return: dict with the stdout and stderr text and the exit code
+        """
+        stdout = CapturedOutput(colors)
+        stderr = CapturedOutput(colors)
+        code = 0
+        with self._lock:
+            try:
+                trending.cli(argv, session=self.session, stdout=stdout, stderr=stderr, cwd=cwd)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                print(traceback.format_exc(), file=stderr)
+                code = 1
+        return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "code": code}
+
+    def serve(self):
+        """
+        Answer commands until interrupted or terminated, then remove the socket
+        :return:
+        """
+        signal.signal(signal.SIGTERM, stop)
+        print("git-trend daemon listening on {}".format(self.path))
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+            os.unlink(self.path)
+
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def is_listening(path):
+    """
+    Check whether a daemon accepts connections on a Unix socket
+    :param path: Unix socket to check
+    :return: True if a connection could be made
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(path)
+        except OSError:
+            return False
+    return True
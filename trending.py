@@ -1,4 +1,9 @@
+import hashlib
 import json
+import os
+import sys
+import threading
+import time
 from abc import ABC, abstractmethod
 from argparse import ArgumentParser
 from collections import OrderedDict
@@ -6,82 +11,230 @@ from urllib.parse import urlencode
 
 import requests
 from bs4 import BeautifulSoup
-from pkg_resources import require
-from prettytable import PrettyTable
-from termcolor import colored
+from urllib3.util.request import ACCEPT_ENCODING
 
+import columnar
+import metrics
+import pipeline
+import planner
+import polling
+import render
+import sinks
+import store
 import utils
-from enums import Colors, ContentTypes
+from archive import PageArchive
+from cache import DEFAULT_EMPTY_TTL, ResultCache
+from enums import ArchiveModes, CacheStates, Colors, ContentTypes, Formats
+from fetcher import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, Fetcher
+from profiling import Profile
+from writers import STREAMING_FORMATS, RecordWriter
+
+
+TEE_BUFFERING = 1 << 16
+# Options holding paths, resolved against the working directory of the client when the daemon runs a command
+PATH_ARGUMENTS = ("output", "batch", "cache_dir", "record", "replay", "metrics_textfile", "store", "store_path", "socket")
+
+# Snapshot stores kept open by the graph command, so a long-running process such as the daemon loads each graph once
+# and reloads it only after another process has written to the store
+graph_stores = {}
 
 
 class Trends(ABC):
+    content_type = None
+    base_url = os.environ.get("GIT_TREND_BASE_URL", "https://github.com")
+    html_parser = "html.parser"
+    request_headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    key_field = None
+    fields = ()
+    item_memo = OrderedDict()
+    item_memo_size = 4096
+    item_memo_lock = threading.Lock()
+    page_memo = OrderedDict()
+    page_memo_size = 256
+    page_memo_lock = threading.Lock()
+
     @abstractmethod
-    def __init__(self, content_type, period, language=None, spoken_language=None):
+    def __init__(self, content_type, period, language=None, spoken_language=None, cache=None, archive=None,
+                 fetcher=None, page=None, base_url=None, err=None):
         """
         Initialize the trends base class that contains information common to repos and developers
         :param content_type: Type of content to parse
         :param period: Time period to use for extracting statistics
         :param language: Filter data on a particular programming language
+        :param cache: Optional ResultCache to serve and store parsed results
+        :param archive: Optional PageArchive to record fetched pages to or replay them from
+        :param fetcher: Optional Fetcher with the timeouts, deadline and hedging to download pages with
+        :param page: Optional (body, encoding, status code) of the page downloaded beforehand, used instead of
+                     fetching it
+        :param base_url: Optional site to get the trending page from instead of github.com (or GIT_TREND_BASE_URL)
+        :param err: Optional text stream for error messages, defaults to the current sys.stderr
         """
 
         self.content_type = content_type
         self.period = period
         self.language = language
         self.spoken_language = spoken_language
+        self.cache = cache
+        self.archive = archive
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+        self.page = page
+        self.base_url = base_url or type(self).base_url
+        self.err = err or sys.stderr
         self.content = None
+        self.page_content = None
+        self.page_encoding = None
+        self.status_code = None
+        self.items = None
+        self.reused_items = 0
+        self.page_digest = None
+        self.unchanged = False
+        self.empty = False
+        self.trending = OrderedDict()
+        self.cached = False
+        self.stale = False
+        self.profile = Profile()
+
+    def __getstate__(self):
+        """
+        Leave out the parsed page and the objects tied to this process when a parsed result is sent to another process
+        :return: attributes to pickle
+        """
+        state = dict(self.__dict__)
+        for name in ("page", "content", "page_content", "items", "cache", "archive", "fetcher", "err"):
+            state[name] = None
+        return state
 
     def get_url(self):
         """
         Get URLs for repository/developer information with optional time period
         :return: URL for processing
         """
-        base_url = "https://github.com/trending{t}{l}".format(
-            t="" if self.content_type == ContentTypes.REPOSITORIES else "/{}".format(ContentTypes.DEVELOPERS),
-            l="" if not self.language else "/{}".format(self.language)
+        return self.build_url(self.period, self.language, self.spoken_language, base_url=self.base_url)
+
+    @classmethod
+    def build_url(cls, period, language=None, spoken_language=None, base_url=None):
+        """
+        Get the URL of the trending page for a query without creating a Trends object
+        :param period: Time period to use for extracting statistics
+        :param language: Filter data on a particular programming language
+        :param spoken_language: Filter data on a particular spoken language
+        :param base_url: Optional site to get the trending page from instead of the default one
+        :return: URL for processing
+        """
+        url = "{b}/trending{t}{l}".format(
+            b=(base_url or cls.base_url).rstrip("/"),
+            t="" if cls.content_type == ContentTypes.REPOSITORIES else "/{}".format(ContentTypes.DEVELOPERS.value),
+            l="" if not language else "/{}".format(language)
         )
 
         params = {}
 
-        if self.period:
-            params["since"] = self.period
-        if self.spoken_language:
-            params["spoken_language_code"] = self.spoken_language
+        if period:
+            params["since"] = period
+        if spoken_language:
+            params["spoken_language_code"] = spoken_language
 
         if params:
             return "{u}?{q}".format(
-                u=base_url,
+                u=url,
                 q=urlencode(params)
             )
         else:
-            return base_url
+            return url
+
+    @classmethod
+    def download(cls, url, fetcher, archive=None, span=None, labels=None):
+        """
+        Download a page from GitHub, recording it to the archive if one is configured
+        :param url: URL to fetch
+        :param fetcher: Fetcher to download the page with
+        :param archive: Optional PageArchive in record mode
+        :param span: Optional profile span attributes, updated with the status code, size and encoding of the response
+        :param labels: Optional metric labels of the query, to count the response or the failed download under
+        :return: tuple of the page body, its declared encoding and the status code
+        :raises requests.exceptions.HTTPError: when GitHub answers with an error status other than 404
+        """
+        span = span if span is not None else {}
+        start = time.perf_counter()
+        try:
+            req = fetcher.get(url, headers=cls.request_headers, span=span)
+        except requests.exceptions.RequestException as e:
+            if labels is not None:
+                metrics.record_fetch_error(e, labels)
+            raise
+        if labels is not None:
+            metrics.record_response(req.status_code, len(req.content), time.perf_counter() - start, labels)
+        span["status_code"] = req.status_code
+        span["bytes"] = len(req.content)
+        span["content_encoding"] = req.headers.get("Content-Encoding", "identity")
+        span["time_to_headers"] = round(req.elapsed.total_seconds(), 4)
+        # A missing page is an empty result; any other error status is a failed fetch, not a page to parse
+        if req.status_code != 404:
+            req.raise_for_status()
+        if archive is not None:
+            archive.save(url, req)
+        return req.content, req.encoding, req.status_code
+
+    def fetch_page(self, url):
+        """
+        Get the raw page for a URL, from the archive when replaying and from GitHub otherwise.
+        The body is kept as bytes and the declared encoding is stored in page_encoding, so it is decoded only once,
+        by the parser.
+        :param url: URL to fetch
+        :return: page body
+        """
+        if self.page is not None:
+            page_content, self.page_encoding, self.status_code = self.page
+            return page_content
+
+        with self.profile.span("fetch") as span:
+            if self.archive is not None and self.archive.mode == ArchiveModes.REPLAY:
+                page_content, self.page_encoding, self.status_code = self.archive.load(url)
+                span["source"] = "archive"
+                span["bytes"] = len(page_content)
+                return page_content
+
+            page_content, self.page_encoding, self.status_code = self.download(
+                url, self.fetcher, archive=self.archive, span=span, labels=self.get_metric_labels())
+            return page_content
 
     def get_github_soup(self):
         """
-        Parse web page using BeautifulSoup's HTML parser
-        :return:
+        Parse web page using the BeautifulSoup parser backend named by html_parser
+        :return: the parsed page, or None when the page does not exist or is unchanged since it was last parsed
         """
         url = self.get_url()
         try:
-            req = requests.get(url)
-            page_content = req.text
-            return BeautifulSoup(page_content, 'html.parser')
+            page_content = self.fetch_page(url)
+            if self.status_code == 404:
+                self.mark_empty()
+                return None
+            self.page_content = page_content
+            if self.reuse_unchanged_page(url, page_content):
+                return None
+            with self.profile.span("soup", parser=self.html_parser):
+                return BeautifulSoup(page_content, self.html_parser, from_encoding=self.page_encoding)
+        except KeyError:
+            print("ERROR: No recorded page for the URL: {}".format(url), file=self.err)
+            print("Record it first using the --record option.", file=self.err)
+            exit(1)
         except requests.exceptions.Timeout:
-            print("ERROR: Request timed out while querying the URL: {}".format(url))
-            print("Please check if the URL is valid.")
+            print("ERROR: Request timed out while querying the URL: {}".format(url), file=self.err)
+            print("Please check if the URL is valid.", file=self.err)
             exit(1)
         except requests.exceptions.TooManyRedirects:
-            print("ERROR: Too many redirects when querying the URL: {}".format(url))
-            print("Please check if the URL is valid.")
+            print("ERROR: Too many redirects when querying the URL: {}".format(url), file=self.err)
+            print("Please check if the URL is valid.", file=self.err)
             exit(1)
         except requests.exceptions.RequestException as e:
-            print("ERROR: Could not get the requested page: {}".format(url))
-            print(utils.get_traceback_string(e))
+            print("ERROR: Could not get the requested page: {}".format(url), file=self.err)
+            print(utils.get_traceback_string(e), file=self.err)
             raise SystemExit(e)
         except ImportError:
-            print("ERROR: No HTML parser found. Please check your install of BeautifulSoup")
+            print("ERROR: No HTML parser found. Please check your install of BeautifulSoup", file=self.err)
             exit(1)
         except Exception as e:
-            print(utils.get_traceback_string(e))
+            print(utils.get_traceback_string(e), file=self.err)
             raise SystemExit(e)
 
     def parse_content(self):
@@ -90,18 +243,277 @@ class Trends(ABC):
         :return:
         """
         soup = self.get_github_soup()
+        if soup is None:
+            return
 
-        main_content = soup.find("main")
-        info_box = main_content.find_all("div", class_="Box")
+        with self.profile.span("parse_content"):
+            main_content = soup.find("main")
+            info_box = main_content.find_all("div", class_="Box") if main_content is not None else []
 
         if len(info_box) != 1:
-            print("ERROR: Could not parse.")
+            print("ERROR: Could not parse.", file=self.err)
             exit(1)
 
         self.content = info_box[0]
 
-    @abstractmethod
+    def get_metric_labels(self):
+        """
+        Get the labels the metrics of this query are counted under
+        :return: dict of label values
+        """
+        return metrics.get_labels(self.content_type, self.language, self.period)
+
+    def load_from_cache(self):
+        """
+        Serve the parsed result from the cache when it is fresh, or stale but within the allowed staleness.
+        Stale results are refreshed in the background.
+        Selections recently found to have no trending entries are served as empty results without being fetched.
+        :return: True if the result was served from the cache
+        """
+        if self.cache is None:
+            return False
+
+        url = self.get_url()
+        trending, state = self.cache.lookup(url)
+        metrics.record_cache_lookup(state, self.get_metric_labels())
+        if state == CacheStates.MISS:
+            return False
+
+        self.trending = trending
+        self.cached = True
+        self.empty = state == CacheStates.EMPTY
+        if state == CacheStates.STALE:
+            self.stale = True
+            self.cache.revalidate(url, self.revalidate)
+        return True
+
+    def reuse_unchanged_page(self, url, page_content):
+        """
+        Compare a hash of the downloaded page with the page last parsed for the same URL, in this process or
+        in the cache, and reuse the previous result when they match so the page is not parsed again
+        :param url: URL of the page
+        :param page_content: downloaded page body
+        :return: True if the previous result was reused
+        """
+        with self.profile.span("hash") as span:
+            self.page_digest = self.get_page_digest(page_content)
+            previous = self.get_previous_page(url, self.cache)
+            self.unchanged = previous is not None and previous[0] == self.page_digest
+            span["unchanged"] = self.unchanged
+
+        if self.unchanged:
+            self.trending = OrderedDict((key, dict(value)) for key, value in previous[1].items())
+        return self.unchanged
+
+    @staticmethod
+    def get_page_digest(page_content):
+        """
+        Hash a downloaded page to recognise it when it is downloaded again unchanged
+        :param page_content: page body
+        :return: hex digest
+        """
+        return hashlib.blake2b(page_content, digest_size=16).hexdigest()
+
+    @classmethod
+    def get_previous_page(cls, url, cache=None):
+        """
+        Get the digest and result of the page last parsed for a URL, in this process or in the cache
+        :param url: URL of the page
+        :param cache: Optional ResultCache
+        :return: tuple of digest and trending data, or None
+        """
+        with cls.page_memo_lock:
+            previous = cls.page_memo.get(url)
+            if previous is not None:
+                cls.page_memo.move_to_end(url)
+        if previous is None and cache is not None:
+            previous = cache.lookup_digest(url)
+        return previous
+
+    def mark_empty(self):
+        """
+        Record that the selection has no trending entries, or no trending page at all, so that it is not fetched
+        again until the empty result expires from the cache
+        :return:
+        """
+        self.empty = True
+        if self.cache is not None:
+            self.cache.put_empty(self.get_url(), status_code=self.status_code)
+
+    def get_empty_message(self):
+        """
+        Get the message shown for a selection without trending entries
+        :return: message
+        """
+        return "There were no trending {} for your selection.".format(self.content_type.value)
+
+    def save_to_cache(self):
+        """
+        Store the parsed result in the cache, if one is configured
+        :return:
+        """
+        if self.page_digest is not None:
+            with self.page_memo_lock:
+                self.page_memo[self.get_url()] = (self.page_digest, self.trending)
+                self.page_memo.move_to_end(self.get_url())
+                if len(self.page_memo) > self.page_memo_size:
+                    self.page_memo.popitem(last=False)
+        if self.cache is not None and not self.cached:
+            self.cache.put(self.get_url(), self.trending, digest=self.page_digest)
+
+    def revalidate(self):
+        """
+        Fetch and parse a fresh copy of the page and store it in the cache
+        :return:
+        """
+        query = {"period": self.period, "language": self.language, "archive": self.archive, "fetcher": self.fetcher,
+                 "base_url": self.base_url}
+        if self.spoken_language:
+            query["spoken_language"] = self.spoken_language
+        fresh = type(self)(**query)
+        if fresh.empty:
+            self.cache.put_empty(self.get_url(), status_code=fresh.status_code)
+            return
+        fresh.parse()
+        self.cache.put(self.get_url(), fresh.trending, digest=fresh.page_digest)
+
+    def get_json_data(self):
+        """
+        Get the trending data for JSON output, marking every entry when it was served stale
+        :return: trending data
+        """
+        if not self.stale:
+            return self.trending
+        return OrderedDict((key, dict(value, stale=True)) for key, value in self.trending.items())
+
+    @classmethod
+    def get_fieldnames(cls):
+        """
+        Get the names of the fields of a flat record, starting with the key
+        :return: list of field names
+        """
+        return [cls.key_field] + list(cls.fields)
+
+    def get_record(self, key, value):
+        """
+        Flatten a trending entry into a single record that includes its key
+        :param key: key of the entry in trending
+        :param value: fields of the entry
+        :return: record dict
+        """
+        record = {self.key_field: key}
+        record.update(value)
+        return record
+
     def parse(self):
+        """
+        Extract every item on the page into trending
+        :return:
+        """
+        for _ in self.iter_parse():
+            pass
+
+    def iter_parse(self):
+        """
+        Extract items one at a time, yielding each entry as soon as it has been added to trending
+        :return: generator of (key, value) pairs
+        """
+        if self.cached:
+            yield from self.get_json_data().items()
+            return
+
+        if self.empty:
+            return
+
+        if self.unchanged:
+            yield from self.trending.items()
+            self.save_to_cache()
+            return
+
+        with self.profile.span("parse") as span:
+            for key, value in self.extract():
+                self.trending[key] = value
+                yield key, value
+            span["items"] = len(self.trending)
+            span["reused"] = self.reused_items
+
+        self.save_to_cache()
+
+    def stream(self, writer, tag=None):
+        """
+        Write every entry to a RecordWriter as soon as it is extracted
+        :param writer: RecordWriter to write records to
+        :param tag: optional query the records belong to, added to each record as its first field
+        :return:
+        """
+        for key, value in self.iter_parse():
+            record = self.get_record(key, value)
+            if tag is not None:
+                record = dict(query=tag, **record)
+            writer.write(record)
+        writer.flush()
+
+    def print_records(self, format_, out=None):
+        """
+        Print already parsed entries in a streaming format
+        :param format_: streaming output format to use
+        :param out: text stream to write to, defaults to the current sys.stdout
+        :return:
+        """
+        out = out or sys.stdout
+        writer = RecordWriter(format_, out, self.get_fieldnames())
+        for key, value in self.get_json_data().items():
+            writer.write(self.get_record(key, value))
+        writer.flush()
+
+    def get_item_digests(self):
+        """
+        Hash the raw HTML of every item so unchanged items can be recognised between polls
+        :return: list of digests in item order, or None when the raw items cannot be matched to the parsed ones
+        """
+        if self.page_content is None:
+            return None
+        digests = [
+            hashlib.blake2b(article, digest_size=16).digest()
+            for article in utils.get_article_slices(self.page_content, "Box-row")
+        ]
+        if len(digests) != len(self.items):
+            return None
+        return digests
+
+    def extract(self):
+        """
+        Extract every item, reusing the information extracted earlier for items whose raw HTML is unchanged
+        :return: generator of (key, information) pairs
+        """
+        self.reused_items = 0
+        digests = self.get_item_digests()
+        for index, item in enumerate(self.items):
+            memo_key = (self.content_type, digests[index]) if digests else None
+            extracted = None
+            if memo_key is not None:
+                with self.item_memo_lock:
+                    extracted = self.item_memo.get(memo_key)
+                    if extracted is not None:
+                        self.item_memo.move_to_end(memo_key)
+
+            if extracted is None:
+                extracted = self.extract_item(item)
+                if memo_key is not None:
+                    with self.item_memo_lock:
+                        self.item_memo[memo_key] = extracted
+                        if len(self.item_memo) > self.item_memo_size:
+                            self.item_memo.popitem(last=False)
+            else:
+                self.reused_items += 1
+
+            key, information = extracted
+            value = {"rank": index + 1}
+            value.update(information)
+            yield key, value
+
+    @abstractmethod
+    def extract_item(self, item):
         pass
 
     @abstractmethod
@@ -110,259 +522,901 @@ class Trends(ABC):
 
 
 class Repositories(Trends):
-    def __init__(self, period, language=None, spoken_language=None):
+    content_type = ContentTypes.REPOSITORIES
+    key_field = "repository"
+    fields = ("rank", "description", "language", "stars", "stars_gained", "url")
+
+    def __init__(self, period, language=None, spoken_language=None, cache=None, archive=None, fetcher=None,
+                 page=None, base_url=None, err=None):
         """
         Get Trending repositories data
         :param period: Time period to use for extracting statistics
         :param language: Filter data on a particular programming language
+        :param cache: Optional ResultCache to serve and store parsed results
+        :param archive: Optional PageArchive to record fetched pages to or replay them from
+        :param fetcher: Optional Fetcher with the timeouts, deadline and hedging to download pages with
+        :param page: Optional (body, encoding, status code) of the page downloaded beforehand, used instead of
+                     fetching it
+        :param base_url: Optional site to get the trending page from instead of github.com (or GIT_TREND_BASE_URL)
+        :param err: Optional text stream for error messages, defaults to the current sys.stderr
         """
         super().__init__(
             content_type=ContentTypes.REPOSITORIES,
             period=period,
             language=language,
-            spoken_language=spoken_language
+            spoken_language=spoken_language,
+            cache=cache,
+            archive=archive,
+            fetcher=fetcher,
+            page=page,
+            base_url=base_url,
+            err=err
         )
+        if self.load_from_cache():
+            return
         super().parse_content()
+        if self.unchanged or self.empty:
+            return
 
-        items = self.content.find_all('article', class_="Box-row")
+        with self.profile.span("find_all") as span:
+            items = self.content.find_all('article', class_="Box-row")
+            span["items"] = len(items)
         status = utils.check_if_list_valid(items, self.content_type)
 
         if not status:
             try:
                 blankslate = self.content.find_all('div', class_="blankslate")
                 if len(blankslate) == 1:
-                    print("There were no trending repositories for your selection.")
-                    exit(1)
+                    self.mark_empty()
+                    return
             except Exception as e:
-                print("Could not get trending {} from the page.".format(self.content_type))
-                print("Encountered Error: {}".format(utils.get_traceback_string()))
-                print("ERROR: Raise an issue on https://github.com/manojkarthick/git-trend/issues")
+                print("Could not get trending {} from the page.".format(self.content_type), file=self.err)
+                print("Encountered Error: {}".format(utils.get_traceback_string()), file=self.err)
+                print("ERROR: Raise an issue on https://github.com/manojkarthick/git-trend/issues", file=self.err)
                 sys.exit(1)
 
         self.items = items
-        self.trending = OrderedDict()
 
-    def parse(self):
+    def extract_item(self, item):
         """
         Get repository information such as name, description, language and stars
-        :return:
+        :param item: article element of the repository
+        :return: tuple of repository name and information, without the rank
         """
-        for index, item in enumerate(self.items):
-            repo_organization, repo_name = item.find("h1", class_="h3 lh-condensed").text.strip(' \t\n\r').split("/")
-            repository = "{}/{}".format(repo_organization.strip(), repo_name.strip())
+        repo_organization, repo_name = item.find("h1", class_="h3 lh-condensed").text.strip(' \t\n\r').split("/")
+        repository = "{}/{}".format(repo_organization.strip(), repo_name.strip())
 
-            repo_desc_info = item.find("p", class_="col-9 color-text-secondary my-1 pr-4")
-            language_info = item.find("span", itemprop="programmingLanguage")
-            stars_info = item.find("a", class_="Link--muted d-inline-block mr-3")
+        repo_desc_info = item.find("p", class_="col-9 color-text-secondary my-1 pr-4")
+        language_info = item.find("span", itemprop="programmingLanguage")
+        stars_info = item.find("a", class_="Link--muted d-inline-block mr-3")
+        stars_gained_info = item.find("span", class_="d-inline-block float-sm-right")
 
-            repo_desc = utils.strip_and_get(repo_desc_info)
-            repo_language = utils.strip_and_get(language_info)
-            repo_stars = utils.strip_and_get(stars_info)
+        repo_desc = utils.strip_and_get(repo_desc_info)
+        repo_language = utils.strip_and_get(language_info)
+        repo_stars = utils.strip_and_get(stars_info)
+        repo_stars_gained = utils.strip_and_get(stars_gained_info).split(" ")[0]
 
-            self.trending[repository] = {
-                "rank": index + 1,
-                "description": repo_desc,
-                "language": repo_language,
-                "stars": repo_stars,
-                "url": "https://github.com/{}".format(repository.strip())
-            }
+        return repository, {
+            "description": repo_desc,
+            "language": repo_language,
+            "stars": repo_stars,
+            "stars_gained": repo_stars_gained,
+            "url": "https://github.com/{}".format(repository.strip())
+        }
 
-    def print(self, format_="default"):
+    def print(self, format_="default", out=None):
         """
         Print trending repositories in the requested output format
         :param format_: output format to use
+        :param out: text stream to write to, defaults to the current sys.stdout
         :return:
         """
-        if format_ == "default":
-            for key, value in self.trending.items():
-                repo_name = key
-                description = value["description"] if value["description"] != "" else "<Unknown Description>"
-                language = value["language"] if value["language"] != "" else "<Unknown Language>"
-                stars = value["stars"]
-                print("➜ {} [{}, ★ {}]:  {}".format(colored(repo_name, Colors.GREEN),
-                                                    colored(language, Colors.BLUE),
-                                                    colored(stars, Colors.YELLOW),
-                                                    colored(description, Colors.RED)))
-        elif format_ == "json":
-            print(json.dumps(self.trending, indent=4))
-        elif format_ == "table":
-            tbl = PrettyTable()
-            tbl.field_names = ["Rank", "Repository", "URL", "Language", "Stars"]
-            for key, value in self.trending.items():
-                repo_name = key
-                url = value["url"]
-                rank = value["rank"]
-                language = value["language"]
-                stars = value["stars"]
-                tbl.add_row([rank, repo_name, url, language, stars])
-            tbl.align = "l"
-            print(tbl)
-        else:
-            print("Unknown format")
+        out = out or sys.stdout
+        with self.profile.span("print", format=format_, items=len(self.trending)):
+            if format_ == "default":
+                colors = render.use_colors(out)
+                lines = []
+                for key, value in self.trending.items():
+                    repo_name = key
+                    description = value["description"] if value["description"] != "" else "<Unknown Description>"
+                    language = value["language"] if value["language"] != "" else "<Unknown Language>"
+                    stars = value["stars"]
+                    lines.append("➜ {} [{}, ★ {}]:  {}".format(render.colorize(repo_name, Colors.GREEN, colors),
+                                                               render.colorize(language, Colors.BLUE, colors),
+                                                               render.colorize(stars, Colors.YELLOW, colors),
+                                                               render.colorize(description, Colors.RED, colors)))
+                if lines:
+                    render.write("\n".join(lines), out)
+            elif format_ == "json":
+                print(json.dumps(self.get_json_data(), indent=4), file=out)
+            elif format_ == "json-compact":
+                print(json.dumps(self.get_json_data(), separators=(",", ":")), file=out)
+            elif format_ in STREAMING_FORMATS:
+                self.print_records(format_, out)
+            elif format_ == "table":
+                rows = []
+                for key, value in self.trending.items():
+                    rows.append([value["rank"], key, value["url"], value["language"], value["stars"]])
+                render.write(render.render_table(["Rank", "Repository", "URL", "Language", "Stars"], rows), out)
+            else:
+                print("Unknown format", file=out)
 
 
 class Developers(Trends):
-    def __init__(self, period, language=None):
+    content_type = ContentTypes.DEVELOPERS
+    key_field = "name"
+    fields = ("rank", "user_id", "repository", "description", "url")
+
+    def __init__(self, period, language=None, cache=None, archive=None, fetcher=None, page=None, base_url=None,
+                 err=None):
         """
         Get Trending developers data
         :param period: Time period to use for extracting statistics
         :param language: Filter data on a particular programming language
+        :param cache: Optional ResultCache to serve and store parsed results
+        :param archive: Optional PageArchive to record fetched pages to or replay them from
+        :param fetcher: Optional Fetcher with the timeouts, deadline and hedging to download pages with
+        :param page: Optional (body, encoding, status code) of the page downloaded beforehand, used instead of
+                     fetching it
+        :param base_url: Optional site to get the trending page from instead of github.com (or GIT_TREND_BASE_URL)
+        :param err: Optional text stream for error messages, defaults to the current sys.stderr
         """
         super().__init__(
             content_type=ContentTypes.DEVELOPERS,
             period=period,
-            language=language
+            language=language,
+            cache=cache,
+            archive=archive,
+            fetcher=fetcher,
+            page=page,
+            base_url=base_url,
+            err=err
         )
+        if self.load_from_cache():
+            return
         super().parse_content()
+        if self.unchanged or self.empty:
+            return
+
+        with self.profile.span("find_all") as span:
+            items = self.content.find_all('article', class_="Box-row d-flex")
+            span["items"] = len(items)
+        status = utils.check_if_list_valid(items, self.content_type)
 
-        items = self.content.find_all('article', class_="Box-row d-flex")
-        utils.check_if_list_valid(items, self.content_type)
+        if not status and len(self.content.find_all('div', class_="blankslate")) == 1:
+            self.mark_empty()
+            return
 
         self.items = items
-        self.trending = OrderedDict()
 
-    def parse(self):
+    def extract_item(self, item):
         """
         Get developer information such as name, id, repo name and description
-        :return:
+        :param item: article element of the developer
+        :return: tuple of user name and information, without the rank
         """
+        container = item.find("div", class_="col-sm-8 d-md-flex")
 
-        for index, item in enumerate(self.items):
-            container = item.find("div", class_="col-sm-8 d-md-flex")
-
-            user_name = container.find("h1", class_="h3 lh-condensed").text.strip(' \t\n\r')
-            user_id_info = container.find("p", class_="f4 text-normal mb-1")
-            repo_desc_info = item.find("div", class_="f6 color-text-secondary mt-1")
-            repo_name_info = item.find("h1", class_="h4 lh-condensed")
+        user_name = container.find("h1", class_="h3 lh-condensed").text.strip(' \t\n\r')
+        user_id_info = container.find("p", class_="f4 text-normal mb-1")
+        repo_desc_info = item.find("div", class_="f6 color-text-secondary mt-1")
+        repo_name_info = item.find("h1", class_="h4 lh-condensed")
 
-            user_id = utils.strip_and_get(user_id_info, user_name)
-            repo_name = utils.strip_and_get(repo_name_info)
-            repo_desc = utils.strip_and_get(repo_desc_info)
+        user_id = utils.strip_and_get(user_id_info, user_name)
+        repo_name = utils.strip_and_get(repo_name_info)
+        repo_desc = utils.strip_and_get(repo_desc_info)
 
-            self.trending[user_name] = {
-                "rank": index + 1,
-                "user_id": user_id,
-                "repository": repo_name,
-                "description": repo_desc,
-                "url": "https://github.com/{}".format(user_id)
-            }
+        return user_name, {
+            "user_id": user_id,
+            "repository": repo_name,
+            "description": repo_desc,
+            "url": "https://github.com/{}".format(user_id)
+        }
 
-    def print(self, format_="default"):
+    def print(self, format_="default", out=None):
         """
         Print trending developers in the requested output format
         :param format_: output format to use
+        :param out: text stream to write to, defaults to the current sys.stdout
         :return:
         """
-        if format_ == "default":
-            for key, value in self.trending.items():
-                user_name = key
-                user_id = value["user_id"] if value["user_id"] != "" else "<Unknown>"
-                repository = value["repository"] if value["repository"] != "" else "<Unknown Repository>"
-                description = value["description"] if value["description"] != "" else "<Unknown Description>"
-                print("➜ {} ({})\n  {}: {}".format(colored(user_name, Colors.GREEN),
-                                                   colored(user_id, Colors.GREEN),
-                                                   colored(repository, Colors.BLUE),
-                                                   colored(description, Colors.RED)))
-        elif format_ == "json":
-            print(json.dumps(self.trending, indent=4))
-        elif format_ == "table":
-            tbl = PrettyTable()
-            tbl.field_names = ["Rank", "User", "User ID", "URL", "Repository"]
-            for key, value in self.trending.items():
-                user_name = key
-                rank = value["rank"]
-                user_id = value["user_id"]
-                url = value["url"]
-                repository = value["repository"]
-                tbl.add_row([rank, user_name, user_id, url, repository])
-            tbl.align = "l"
-            print(tbl)
+        out = out or sys.stdout
+        with self.profile.span("print", format=format_, items=len(self.trending)):
+            if format_ == "default":
+                colors = render.use_colors(out)
+                lines = []
+                for key, value in self.trending.items():
+                    user_name = key
+                    user_id = value["user_id"] if value["user_id"] != "" else "<Unknown>"
+                    repository = value["repository"] if value["repository"] != "" else "<Unknown Repository>"
+                    description = value["description"] if value["description"] != "" else "<Unknown Description>"
+                    lines.append("➜ {} ({})\n  {}: {}".format(render.colorize(user_name, Colors.GREEN, colors),
+                                                              render.colorize(user_id, Colors.GREEN, colors),
+                                                              render.colorize(repository, Colors.BLUE, colors),
+                                                              render.colorize(description, Colors.RED, colors)))
+                if lines:
+                    render.write("\n".join(lines), out)
+            elif format_ == "json":
+                print(json.dumps(self.get_json_data(), indent=4), file=out)
+            elif format_ == "json-compact":
+                print(json.dumps(self.get_json_data(), separators=(",", ":")), file=out)
+            elif format_ in STREAMING_FORMATS:
+                self.print_records(format_, out)
+            elif format_ == "table":
+                rows = []
+                for key, value in self.trending.items():
+                    rows.append([value["rank"], key, value["user_id"], value["url"], value["repository"]])
+                render.write(render.render_table(["Rank", "User", "User ID", "URL", "Repository"], rows), out)
+            else:
+                print("Unknown format", file=out)
+
+
+def open_snapshot_store(path, shared=False, out=None):
+    """
+    Open an existing snapshot store for the stats, search and graph commands
+    :param path: Path of the database file
+    :param shared: whether the store is kept open and used by several threads, one at a time
+    :param out: text stream for error messages, defaults to the current sys.stdout
+    :return: SnapshotStore
+    """
+    out = out or sys.stdout
+    if not os.path.exists(path):
+        print("ERROR: No snapshots found at {}. Save some using the --store option.".format(path), file=out)
+        exit(1)
+    return store.SnapshotStore(path, shared=shared)
+
+
+def get_graph_store(path, out=None):
+    """
+    Get the snapshot store for the graph command, reusing the one opened by an earlier command of this process so its
+    graph stays loaded. A store whose file was replaced or removed since is opened again.
+    :param path: Path of the database file
+    :param out: text stream for error messages, defaults to the current sys.stdout
+    :return: SnapshotStore
+    """
+    path = os.path.abspath(path)
+    try:
+        inode = os.stat(path).st_ino
+    except OSError:
+        inode = None
+    if path in graph_stores:
+        snapshot_store, opened_inode = graph_stores[path]
+        if inode is not None and inode == opened_inode:
+            return snapshot_store
+        snapshot_store.close()
+        del graph_stores[path]
+    snapshot_store = open_snapshot_store(path, shared=True, out=out)
+    graph_stores[path] = (snapshot_store, inode)
+    return snapshot_store
+
+
+def get_since(duration, out=None):
+    """
+    Get the timestamp a duration such as "30d" ago, exiting on invalid input
+    :param duration: duration string, or None
+    :param out: text stream for error messages, defaults to the current sys.stdout
+    :return: timestamp, or None when no duration was given
+    """
+    out = out or sys.stdout
+    if not duration:
+        return None
+    try:
+        return time.time() - utils.parse_duration(duration)
+    except ValueError as e:
+        print("ERROR: {}".format(e), file=out)
+        exit(1)
+
+
+def read_batch(path, default_period, out=None):
+    """
+    Read batch queries, one per line, from a file or from stdin when the path is "-".
+    Blank lines and lines starting with # are ignored.
+    :param path: Path of the query file, or "-"
+    :param default_period: period for queries that do not name one
+    :param out: text stream for error messages, defaults to the current sys.stdout
+    :return: list of (query text, Trends subclass, query arguments) tuples
+    """
+    out = out or sys.stdout
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            print("ERROR: Could not read the batch file {}: {}".format(path, e), file=out)
+            exit(1)
+
+    jobs = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            content_type, language, period, spoken_language = utils.parse_query(line, default_period)
+        except ValueError as e:
+            print("ERROR: Invalid query on line {}: {}. {}".format(number, line, e), file=out)
+            exit(1)
+        query = {"period": period, "language": language}
+        if content_type == ContentTypes.REPOSITORIES:
+            query["spoken_language"] = spoken_language
+        jobs.append((line, Repositories if content_type == ContentTypes.REPOSITORIES else Developers, query))
+
+    if not jobs:
+        print("ERROR: No queries found in the batch input", file=out)
+        exit(1)
+    return jobs
+
+
+def get_tee(spec, out=None):
+    """
+    Parse an additional output given as FORMAT:PATH, exiting on invalid input
+    :param spec: output specification, e.g. "ndjson:trending.ndjson"
+    :param out: text stream for error messages, defaults to the current sys.stdout
+    :return: tuple of format and path
+    """
+    out = out or sys.stdout
+    format_, _, path = spec.partition(":")
+    if format_ not in utils.get_supported_formats() or not path:
+        print("ERROR: Invalid --tee output: {}. Use FORMAT:PATH with one of the formats: {}".format(
+            spec, ", ".join(utils.get_supported_formats())))
+        exit(1)
+    if format_ == Formats.PARQUET:
+        columnar.check_pyarrow(out)
+    return format_, path
+
+
+def stats_command(args, out=None):
+    out = out or sys.stdout
+    since = get_since(args.since, out)
+    snapshot_store = open_snapshot_store(args.store_path, out=out)
+    stats = snapshot_store.get_stats(args.key, since=since)
+    snapshot_store.close()
+    if stats is None:
+        print("ERROR: {} was not found in any stored snapshot.".format(args.key), file=out)
+        exit(1)
+    store.print_stats(stats, args.command_format, out)
+
+
+def search_command(args, out=None):
+    out = out or sys.stdout
+    since = get_since(args.since, out)
+    snapshot_store = open_snapshot_store(args.store_path, out=out)
+    if not snapshot_store.has_fts:
+        print("ERROR: Search needs SQLite with FTS5 support, which this Python installation does not have.", file=out)
+        exit(1)
+    results = snapshot_store.search(args.query, since=since, limit=args.limit)
+    snapshot_store.close()
+    store.print_search_results(results, args.command_format, out)
+
+
+def graph_command(args, out=None):
+    out = out or sys.stdout
+    since = get_since(args.since, out) or 0
+    snapshot_store = get_graph_store(args.store_path, out)
+    if args.developers_in:
+        results = snapshot_store.graph.get_developers_in_language(args.developers_in, since=since)
+    else:
+        results = snapshot_store.graph.get_co_trending(args.co_trending, since=since)
+    if args.command_format == "json":
+        print(json.dumps(results, indent=4), file=out)
+    elif results:
+        render.write("\n".join("➜ {}".format(result) for result in results), out)
+
+
+def daemon_command(args):
+    # Imported here as the daemon module imports this one
+    import trend_daemon
+    if args.metrics_port is not None:
+        metrics.start_http_server(args.metrics_port)
+        print("git-trend daemon serving metrics on port {}".format(args.metrics_port))
+    trend_daemon.Daemon(args.socket).serve()
+
+
+class CommandParser(ArgumentParser):
+    def __init__(self, *args, stdout=None, stderr=None, **kwargs):
+        """
+        Argument parser printing its help, usage and errors to the streams of the command rather than to the current
+        sys.stdout and sys.stderr
+        :param stdout: Optional text stream for the help, defaults to the current sys.stdout
+        :param stderr: Optional text stream for usage errors, defaults to the current sys.stderr
+        """
+        super().__init__(*args, **kwargs)
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def _print_message(self, message, file=None):
+        if file is sys.stderr:
+            file = self.stderr or file
         else:
-            print("Unknown format")
+            file = self.stdout or file
+        super()._print_message(message, file)
+
 
+def resolve_paths(args, cwd):
+    """
+    Make the paths given on the command line absolute, resolving relative ones against a working directory
+    :param args: parsed arguments, updated in place
+    :param cwd: directory the paths were given from
+    :return:
+    """
+    for name in PATH_ARGUMENTS:
+        path = getattr(args, name, None)
+        if path and path != "-":
+            setattr(args, name, os.path.join(cwd, path))
+    tees = []
+    for spec in getattr(args, "tee", None) or []:
+        format_, separator, path = spec.partition(":")
+        tees.append(format_ + separator + os.path.join(cwd, path) if path else spec)
+    if tees:
+        args.tee = tees
 
-def cli():
-    parser = ArgumentParser(
-        description='This tool allows you to look at Github trending repositories and developers')
+
+def cli(argv=None, session=None, stdout=None, stderr=None, cwd=None):
+    """
+    Run the git-trend command line
+    :param argv: command line arguments, defaults to sys.argv
+    :param session: Optional requests Session to fetch pages with, kept alive across calls by the daemon
+    :param stdout: Optional text stream for the output, defaults to the current sys.stdout
+    :param stderr: Optional text stream for errors and profiles, defaults to the current sys.stderr
+    :param cwd: Optional directory to resolve relative paths against instead of the working directory, used by the
+                daemon to run commands for clients in other directories
+    :return:
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    # Options must be spelled out in full, so the client can tell from the raw arguments which commands to keep
+    # in-process instead of forwarding them to the daemon
+    parser = CommandParser(
+        description='This tool allows you to look at Github trending repositories and developers', allow_abbrev=False,
+        stdout=stdout, stderr=stderr)
     parser.add_argument('--repos', action='store_true', help='to view trending repositories')
     parser.add_argument('--devs', action='store_true', help='to view trending developers')
     parser.add_argument('--period', type=str, choices=utils.get_supported_periods(), default='daily',
                         help='time period of results')
-    parser.add_argument('--language', type=str, default=None,
-                        help='the language whose trends you want to fetch. Use --languages flag to see supported languages.',
+    parser.add_argument('--language', type=str, default=None, nargs='+',
+                        help='the language(s) whose trends you want to fetch. Use --languages flag to see supported languages.',
                         choices=utils.get_supported_languages(), metavar='<language_code>')
     parser.add_argument('--spoken-language', type=str, default=None,
                         help='spoken language you want to filter results on. Use --spoken-languages flag to see supported spoken languages.',
                         choices=utils.get_supported_spoken_languages(), metavar='<spoken_language_code>')
     parser.add_argument("--format", type=str, choices=utils.get_supported_formats(), default="default",
                         help="Output format")
+    parser.add_argument('--output', type=str, default=None, metavar='FILE',
+                        help='write results to a file instead of stdout')
+    parser.add_argument('--batch', type=str, default=None, nargs='?', const='-', metavar='FILE',
+                        help='run the queries in a file, or stdin, one per line such as "repos python weekly en"')
+    parser.add_argument('--tee', type=str, default=None, action='append', metavar='FORMAT:PATH',
+                        help='also write the results to a file in another format, can be repeated')
+    parser.add_argument('--top', type=int, default=None, metavar='K',
+                        help='merge the results for all languages into a single deduplicated top K ranking')
     parser.add_argument('--languages', action='store_true', help='print list of languages supported')
     parser.add_argument('--spoken-languages', action='store_true', help='print list of spoken languages supported')
+    parser.add_argument('--cache', action='store_true', help='serve and store results using the local cache')
+    parser.add_argument('--cache-dir', type=str, default=None, help='directory for cached results')
+    parser.add_argument('--cache-ttl', type=int, default=600, help='seconds for which cached results are fresh')
+    parser.add_argument('--stale-while-revalidate', action='store_true',
+                        help='serve expired cached results immediately and refresh them in the background')
+    parser.add_argument('--max-stale', type=int, default=3600,
+                        help='seconds past the cache ttl for which an expired result may still be served')
+    parser.add_argument('--empty-ttl', type=int, default=DEFAULT_EMPTY_TTL,
+                        help='seconds for which a selection without trending entries is not fetched again')
+    parser.add_argument('--plan', action='store_true',
+                        help='only refresh the expired cached results most worth refreshing within --budget')
+    parser.add_argument('--budget', type=int, default=planner.DEFAULT_BUDGET, metavar='N',
+                        help='pages that may be fetched per hour with --plan')
+    parser.add_argument('--record', type=str, default=None, metavar='DIR',
+                        help='save every fetched page with its URL and headers to a directory')
+    parser.add_argument('--replay', type=str, default=None, metavar='DIR',
+                        help='serve pages saved with --record instead of fetching them')
+    parser.add_argument('--base-url', type=str, default=None, metavar='URL',
+                        help='site to fetch trending pages from instead of https://github.com')
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT, metavar='SECONDS',
+                        help='seconds to wait for a connection to GitHub')
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT, metavar='SECONDS',
+                        help='seconds to wait for data from GitHub before giving up on a page')
+    parser.add_argument('--deadline', type=float, default=None, metavar='SECONDS',
+                        help='overall time limit for fetching every page of the run')
+    parser.add_argument('--hedge', action='store_true',
+                        help='send a duplicate request when a page is slower than the 95th percentile and use the first response')
+    parser.add_argument('--hedge-delay', type=float, default=None, metavar='SECONDS',
+                        help='fixed delay before the duplicate request of --hedge')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='fetch, parse and write pages at the same time in separate stages')
+    parser.add_argument('--fetch-workers', type=int, default=pipeline.DEFAULT_FETCH_WORKERS, metavar='N',
+                        help='pages downloaded at the same time with --pipeline')
+    parser.add_argument('--parse-workers', type=int, default=pipeline.DEFAULT_PARSE_WORKERS, metavar='N',
+                        help='pages parsed at the same time with --pipeline')
+    parser.add_argument('--parse-processes', action='store_true',
+                        help='parse in a pool of processes instead of threads with --pipeline, to use several cores')
+    parser.add_argument('--queue-size', type=int, default=pipeline.DEFAULT_QUEUE_SIZE, metavar='N',
+                        help='pages held between two stages of --pipeline before the earlier stage waits')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep polling the queries and print a list again whenever it changes')
+    parser.add_argument('--min-interval', type=float, default=polling.DEFAULT_MIN_INTERVAL, metavar='SECONDS',
+                        help='shortest time between two polls of a page with --watch')
+    parser.add_argument('--max-interval', type=float, default=polling.DEFAULT_MAX_INTERVAL, metavar='SECONDS',
+                        help='longest time between two polls of a page with --watch')
+    parser.add_argument('--profile', action='store_true', help='print a breakdown of time spent per stage to stderr')
+    parser.add_argument('--metrics-textfile', type=str, default=None, metavar='PATH',
+                        help='write run metrics in the Prometheus textfile collector format')
+    parser.add_argument('--store', type=str, default=None, nargs='?', const=store.DEFAULT_STORE_PATH, metavar='PATH',
+                        help='save a snapshot of every result to a SQLite database')
     parser.add_argument('--version', action='store_true', help="Package version")
-    args = parser.parse_args()
+
+    subparsers = parser.add_subparsers(dest='command', metavar='<command>')
+    stats_parser = subparsers.add_parser('stats', stdout=stdout, stderr=stderr,
+                                         help='show the rank and star trajectory of a repository or developer')
+    stats_parser.add_argument('key', type=str, help='repository (org/repo) or developer name')
+    stats_parser.add_argument('--since', type=str, default=None, help='only show the trajectory for this duration, e.g. 30d')
+    stats_parser.add_argument('--store', dest='store_path', type=str, default=store.DEFAULT_STORE_PATH, metavar='PATH',
+                              help='SQLite database written with --store')
+    stats_parser.add_argument('--format', dest='command_format', type=str, choices=["default", "json"], default="default",
+                              help='Output format')
+    search_parser = subparsers.add_parser('search', stdout=stdout, stderr=stderr,
+                                          help='search the descriptions of stored repositories and developers')
+    search_parser.add_argument('query', type=str, help='words to search for')
+    search_parser.add_argument('--since', type=str, default=None, help='only match entries seen within this duration, e.g. 30d')
+    search_parser.add_argument('--limit', type=int, default=20, help='maximum number of results')
+    search_parser.add_argument('--store', dest='store_path', type=str, default=store.DEFAULT_STORE_PATH, metavar='PATH',
+                               help='SQLite database written with --store')
+    search_parser.add_argument('--format', dest='command_format', type=str, choices=["default", "json"], default="default",
+                               help='Output format')
+    graph_parser = subparsers.add_parser('graph', stdout=stdout, stderr=stderr,
+                                         help='query relationships between stored developers, repositories and languages')
+    graph_query = graph_parser.add_mutually_exclusive_group(required=True)
+    graph_query.add_argument('--developers-in', type=str, default=None, metavar='<language_code>',
+                             help='developers whose repositories trended in a language')
+    graph_query.add_argument('--co-trending', type=str, default=None, metavar='ORG/REPO',
+                             help='other repositories of the same owner that trended')
+    graph_parser.add_argument('--since', type=str, default=None, help='only consider links seen within this duration, e.g. 30d')
+    graph_parser.add_argument('--store', dest='store_path', type=str, default=store.DEFAULT_STORE_PATH, metavar='PATH',
+                              help='SQLite database written with --store')
+    graph_parser.add_argument('--format', dest='command_format', type=str, choices=["default", "json"], default="default",
+                              help='Output format')
+
+    daemon_parser = subparsers.add_parser('daemon', stdout=stdout, stderr=stderr,
+                                          help='answer queries from a warm process the CLI forwards them to')
+    daemon_parser.add_argument('--socket', type=str, default=None, metavar='PATH',
+                               help='Unix socket to listen on, defaults to $GIT_TREND_SOCKET or ~/.cache/git-trend/daemon.sock')
+    daemon_parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                               help='serve the metrics of every command the daemon runs on /metrics on this port')
+
+    args = parser.parse_args(argv)
+    if cwd is not None:
+        resolve_paths(args, cwd)
+
+    if args.command == 'stats':
+        stats_command(args, stdout)
+        exit(0)
+
+    if args.command == 'search':
+        search_command(args, stdout)
+        exit(0)
+
+    if args.command == 'graph':
+        graph_command(args, stdout)
+        exit(0)
+
+    if args.command == 'daemon':
+        daemon_command(args)
+        exit(0)
 
     if args.version:
-        print("git-trend v{}".format(require("git-trend")[0].version))
+        # Imported here as pkg_resources is slow to import and only needed for the version
+        from pkg_resources import require
+        print("git-trend v{}".format(require("git-trend")[0].version), file=stdout)
         exit(0)
 
     if args.languages:
         if args.repos or args.devs or args.language:
-            print('ERROR: languages option cannot be used alongside other options. Omit --languages.')
+            print('ERROR: languages option cannot be used alongside other options. Omit --languages.', file=stdout)
             exit(1)
         else:
-            print("Languages currently supported: {}")
-            utils.print_supported_languages("programming")
+            print("Languages currently supported: {}", file=stdout)
+            utils.print_supported_languages("programming", stdout)
             exit(0)
 
     if args.spoken_languages:
         if args.repos or args.devs or args.language or args.spoken_language:
-            print('ERROR: spoken-languages option cannot be used alongside other options. Omit --spoken-languages.')
+            print('ERROR: spoken-languages option cannot be used alongside other options. Omit --spoken-languages.',
+                  file=stdout)
             exit(1)
         else:
-            print("Languages currently supported: ")
-            utils.print_supported_languages("spoken")
+            print("Languages currently supported: ", file=stdout)
+            utils.print_supported_languages("spoken", stdout)
             exit(0)
 
     else:
-        if args.repos and not args.devs:
+        if args.batch is not None:
+            if args.repos or args.devs or args.language or args.spoken_language:
+                print("ERROR: --batch cannot be used alongside --repos, --devs, --language or --spoken-language.",
+                      file=stdout)
+                exit(1)
+            content_type = None
+        elif args.repos and not args.devs:
             content_type = ContentTypes.REPOSITORIES
         elif args.devs and not args.repos:
             content_type = ContentTypes.DEVELOPERS
         elif args.repos and args.devs:
-            print("ERROR: Use either repos or devs flag, not both.")
+            print("ERROR: Use either repos or devs flag, not both.", file=stdout)
             exit(1)
         elif not args.repos and (not args.devs):
-            print("ERROR: Use either repos or devs flag.")
+            print("ERROR: Use either repos or devs flag.", file=stdout)
             exit(1)
         else:
-            print("ERROR: Ambiguous input, please select either repos or devs")
+            print("ERROR: Ambiguous input, please select either repos or devs", file=stdout)
             exit(1)
 
         if content_type == ContentTypes.DEVELOPERS and args.spoken_language:
-            print("ERROR: --spoken-language option is only supported for repos")
+            print("ERROR: --spoken-language option is only supported for repos", file=stdout)
             exit(1)
 
-        try:
-            if content_type == ContentTypes.REPOSITORIES:
-                repositories = Repositories(
-                    period=args.period,
-                    language=args.language,
-                    spoken_language=args.spoken_language
-                )
+        if args.record and args.replay:
+            print("ERROR: Use either record or replay option, not both.", file=stdout)
+            exit(1)
+
+        archive = None
+        if args.record:
+            archive = PageArchive(args.record, mode=ArchiveModes.RECORD)
+        elif args.replay:
+            archive = PageArchive(args.replay, mode=ArchiveModes.REPLAY)
+
+        cache = None
+        if args.cache or args.stale_while_revalidate:
+            cache = ResultCache(
+                directory=args.cache_dir,
+                ttl=args.cache_ttl,
+                stale_while_revalidate=args.stale_while_revalidate,
+                max_stale=args.max_stale,
+                empty_ttl=args.empty_ttl
+            )
+
+        if args.watch and (args.plan or args.top is not None):
+            print("ERROR: --watch cannot be used with --plan or --top", file=stdout)
+            exit(1)
+        if args.watch and not 0 < args.min_interval <= args.max_interval:
+            print("ERROR: --min-interval must be positive and no longer than --max-interval", file=stdout)
+            exit(1)
+
+        if args.plan and cache is None:
+            print("ERROR: --plan requires --cache", file=stdout)
+            exit(1)
+        sweep_planner = planner.SweepPlanner(cache, budget=args.budget) if cache is not None else None
+
+        if args.format == Formats.PARQUET:
+            if not args.output:
+                print("ERROR: --format parquet requires --output DIR", file=stdout)
+                exit(1)
+            columnar.check_pyarrow(stdout)
 
-                repositories.parse()
-                repositories.print(format_=args.format)
+        if args.top is not None and args.format == Formats.PARQUET:
+            print("ERROR: --top cannot be used with --format parquet", file=stdout)
+            exit(1)
 
-            if content_type == ContentTypes.DEVELOPERS:
-                developers = Developers(
-                    period=args.period,
-                    language=args.language
+        if args.batch is not None:
+            if args.top is not None:
+                print("ERROR: --top cannot be used with --batch", file=stdout)
+                exit(1)
+            jobs = read_batch(args.batch, args.period, stdout)
+        else:
+            trends_class = Repositories if content_type == ContentTypes.REPOSITORIES else Developers
+            # Results for several languages are tagged with their language like batch queries, so combined output
+            # can be split by list again
+            several = len(args.language or []) > 1
+            jobs = []
+            for language in args.language or [None]:
+                query = {"period": args.period, "language": language}
+                if content_type == ContentTypes.REPOSITORIES:
+                    query["spoken_language"] = args.spoken_language
+                jobs.append((language if several else None, trends_class, query))
+        tagged = any(tag is not None for tag, _, _ in jobs)
+
+        if args.base_url:
+            # The site travels with every query, so pages fetched for it are never mixed up with other runs in the
+            # same process, such as commands run by the daemon
+            for _, _, query in jobs:
+                query["base_url"] = args.base_url
+
+        if args.plan:
+            planned = sweep_planner.plan(jobs)
+            if args.profile:
+                rows = [["{:.3f}".format(score), tag or trends_class.build_url(**query)]
+                        for score, (tag, trends_class, query) in planned]
+                print(render.render_table(["Score", "Query"], rows), file=stderr)
+            if not planned:
+                print("Nothing to refresh: every cached result is fresh or the hourly budget is spent.", file=stdout)
+                exit(0)
+            jobs = [job for _, job in planned]
+        elif sweep_planner is not None:
+            for _, trends_class, query in jobs:
+                sweep_planner.record_request(trends_class.build_url(**query))
+
+        tees = [get_tee(spec, stdout) for spec in args.tee or []]
+
+        trends_classes = []
+        for _, trends_class, _ in jobs:
+            if trends_class not in trends_classes:
+                trends_classes.append(trends_class)
+        uses_parquet = args.format == Formats.PARQUET or any(format_ == Formats.PARQUET for format_, _ in tees)
+        if uses_parquet and len(trends_classes) > 1:
+            print("ERROR: Parquet output needs the queries of a batch to be all repos or all devs", file=stdout)
+            exit(1)
+
+        if min(args.fetch_workers, args.parse_workers, args.queue_size) < 1:
+            print("ERROR: --fetch-workers, --parse-workers and --queue-size must be at least 1", file=stdout)
+            exit(1)
+
+        snapshot_store = store.SnapshotStore(args.store) if args.store else None
+        if session is None:
+            session = requests.Session()
+            if args.pipeline:
+                # Keep a pooled connection for every fetch worker
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.fetch_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+        page_fetcher = Fetcher(
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            deadline=args.deadline,
+            hedge=args.hedge or args.hedge_delay is not None,
+            hedge_delay=args.hedge_delay,
+            session=session
+        )
+
+        fieldnames = ["query"] if tagged else []
+        for trends_class in trends_classes:
+            fieldnames.extend(name for name in trends_class.get_fieldnames() if name not in fieldnames)
+
+        streams = []
+        out = stdout
+        if args.output and args.format != Formats.PARQUET:
+            out = open(args.output, "w", encoding="utf-8", newline="")
+            streams.append(out)
+        if args.top is not None:
+            output_sinks = [sinks.TopKSink(args.top, args.format, out)]
+        else:
+            output_sinks = [sinks.create_sink(args.format, args.output if args.format == Formats.PARQUET else out,
+                                              fieldnames, batch=tagged)]
+        for format_, path in tees:
+            if format_ == Formats.PARQUET:
+                output_sinks.append(sinks.ParquetSink(path))
+                continue
+            stream = open(path, "w", encoding="utf-8", newline="", buffering=TEE_BUFFERING)
+            streams.append(stream)
+            output_sinks.append(sinks.create_sink(format_, stream, fieldnames, batch=tagged,
+                                                  buffer_size=sinks.DEFAULT_BUFFER_SIZE))
+        if snapshot_store is not None:
+            output_sinks.append(sinks.StoreSink(snapshot_store))
+        output_sinks.append(sinks.MetricsSink(args.metrics_textfile))
+        if sweep_planner is not None:
+            output_sinks.append(sinks.PlannerSink(sweep_planner))
+
+        schedule = None
+        if args.watch:
+            if cache is not None:
+                # A poll served from a cached result could never see the list change
+                cache.ttl = min(cache.ttl, args.min_interval)
+            schedule = polling.PollSchedule(
+                min_interval=args.min_interval,
+                max_interval=args.max_interval,
+                path=os.path.join(cache.directory, "polling.json") if cache is not None else None
+            )
+        shown = set()
+
+        def write(tag, trends, parsed=True):
+            if schedule is not None:
+                if not parsed:
+                    trends.parse()
+                    parsed = True
+                url = trends.get_url()
+                changed = schedule.record(url, list(trends.trending), cached=trends.cached)
+                if not changed and url in shown:
+                    return
+                shown.add(url)
+            sinks.fan_out(trends, output_sinks, tag=tag, parsed=parsed)
+            if args.profile:
+                print(trends.profile.render(), file=stderr)
+
+        def skipped(trends_class, query, trends=None):
+            # Failed and empty polls move the schedule too, so errors and rate limiting are backed off from instead
+            # of being polled again at the usual rate
+            if schedule is None:
+                return
+            url = trends_class.build_url(**query)
+            if trends is None:
+                schedule.record_failure(url)
+            else:
+                schedule.record(url, [], cached=trends.cached)
+
+        def run_jobs(jobs):
+            # A single query that fails ends the run with an error, unless it is polled again with --watch
+            single = len(jobs) == 1 and schedule is None
+            if args.pipeline:
+                page_pipeline = pipeline.Pipeline(
+                    cache=cache,
+                    archive=archive,
+                    fetcher=page_fetcher,
+                    fetch_workers=args.fetch_workers,
+                    parse_workers=args.parse_workers,
+                    processes=args.parse_processes,
+                    queue_size=args.queue_size,
+                    err=stderr
                 )
+                failed = page_pipeline.run(jobs, write, skipped)
+                if args.profile:
+                    print(page_pipeline.report(), file=stderr)
+                if single and failed:
+                    exit(1)
+                return failed
+
+            failed = 0
+            for tag, trends_class, query in jobs:
+                try:
+                    trends = trends_class(cache=cache, archive=archive, fetcher=page_fetcher, err=stderr, **query)
+                    if not trends.empty:
+                        write(tag, trends, parsed=False)
+                        continue
+                except SystemExit:
+                    # A page that cannot be fetched or parsed for one query should not end a run across several
+                    # languages or a batch
+                    if single:
+                        raise
+                    print("ERROR: Skipping query: {}".format(tag or trends_class.build_url(**query)), file=stderr)
+                    skipped(trends_class, query)
+                    failed += 1
+                    continue
+                except Exception as e:
+                    if single:
+                        raise
+                    print("ERROR: Could not parse elements of the GitHub page", file=stderr)
+                    print(utils.get_traceback_string(e), file=stderr)
+                    print("ERROR: Skipping query: {}".format(tag or trends_class.build_url(**query)), file=stderr)
+                    skipped(trends_class, query)
+                    failed += 1
+                    continue
+
+                if single:
+                    print(trends.get_empty_message(), file=stdout)
+                    exit(1)
+                print(trends.get_empty_message(), file=stderr)
+                if tag is not None:
+                    print("ERROR: Skipping query: {}".format(tag), file=stderr)
+                skipped(trends_class, query, trends)
+                failed += 1
+            return failed
+
+        try:
+            if schedule is not None:
+                urls = [trends_class.build_url(**query) for _, trends_class, query in jobs]
+                try:
+                    while True:
+                        now = time.time()
+                        due = []
+                        for job, url in zip(jobs, urls):
+                            if schedule.is_due(url, now):
+                                schedule.start(url, now)
+                                due.append(job)
+                        run_jobs(due)
+                        schedule.save()
+                        time.sleep(max(1.0, schedule.get_wait(urls)))
+                except KeyboardInterrupt:
+                    pass
+            elif run_jobs(jobs) == len(jobs):
+                exit(1)
 
-                developers.parse()
-                developers.print(format_=args.format)
+            for sink in output_sinks:
+                sink.close()
 
         except Exception as e:
-            print("ERROR: Could not parse elements of the GitHub page")
-            print(utils.get_traceback_string(e))
+            print("ERROR: Could not parse elements of the GitHub page", file=stderr)
+            print(utils.get_traceback_string(e), file=stderr)
             exit(1)
+        finally:
+            for stream in streams:
+                stream.close()
+            if snapshot_store is not None:
+                snapshot_store.close()
+            if sweep_planner is not None:
+                sweep_planner.spend(page_fetcher.requests)
+                sweep_planner.save()
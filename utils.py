@@ -1,8 +1,9 @@
+import re
+import sys
 from traceback import format_tb
 
-from prettytable import PrettyTable
-
-from enums import Periods, Formats
+import render
+from enums import ContentTypes, Periods, Formats
 from languages import get_languages_json, get_spoken_languages_json
 
 
@@ -60,26 +61,21 @@ def get_supported_spoken_languages():
     return languages
 
 
-def print_supported_languages(dtype="programming"):
-    tbl = PrettyTable()
-
+def print_supported_languages(dtype="programming", out=None):
+    out = out or sys.stdout
     language_info = None
     if dtype == "programming":
-        tbl.field_names = ["Language Name", "Language Code"]
+        field_names = ["Language Name", "Language Code"]
         language_info = get_languages_json()
     elif dtype == "spoken":
-        tbl.field_names = ["Spoken Language Name", "Spoken Language Code"]
+        field_names = ["Spoken Language Name", "Spoken Language Code"]
         language_info = get_spoken_languages_json()
     else:
-        print("ERROR: Unknown data type provided. Exiting.")
+        print("ERROR: Unknown data type provided. Exiting.", file=out)
         exit(1)
 
-    for info in language_info:
-        language_code = info["urlParam"]
-        language_name = info["name"]
-        tbl.add_row([language_name, language_code])
-    tbl.align = "l"
-    print(tbl)
+    rows = [[info["name"], info["urlParam"]] for info in language_info]
+    render.write(render.render_table(field_names, rows), out)
 
 
 def strip_and_get(val, fallback=""):
@@ -115,3 +111,107 @@ def get_traceback_string(e):
     :return:
     """
     return ''.join(format_tb(e.__traceback__))
+
+
+def parse_count(val):
+    """
+    Convert a count as displayed on GitHub (e.g. "1,234") to an integer
+    :param val: displayed count
+    :return: integer count, or None when the count is missing
+    """
+    digits = val.replace(",", "").strip()
+    if not digits.isdigit():
+        return None
+    return int(digits)
+
+
+def parse_duration(val):
+    """
+    Convert a duration such as "30d", "12h", "2w" or "45m" to seconds
+    :param val: duration with a unit suffix
+    :return: number of seconds
+    """
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    try:
+        return float(val[:-1]) * units[val[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError("Invalid duration: {}. Use a number followed by m, h, d or w.".format(val))
+
+
+def parse_query(line, default_period="daily"):
+    """
+    Parse a batch query such as "repos python weekly en": the content type, then optionally the language
+    ("all" for every language), the period and, for repositories, the spoken language
+    :param line: query text
+    :param default_period: period used when the query does not name one
+    :return: tuple of content type, language, period and spoken language
+    """
+    tokens = line.split()
+    content_types = {"repos": ContentTypes.REPOSITORIES, "devs": ContentTypes.DEVELOPERS}
+    if not tokens or tokens[0] not in content_types:
+        raise ValueError("A query must start with repos or devs")
+    content_type = content_types[tokens[0]]
+
+    period = None
+    positional = []
+    for token in tokens[1:]:
+        if token in get_supported_periods() and period is None:
+            period = token
+        else:
+            positional.append(token)
+    if len(positional) > (2 if content_type == ContentTypes.REPOSITORIES else 1):
+        raise ValueError("Too many values in query")
+
+    language = positional[0] if positional and positional[0] != "all" else None
+    if language is not None and language not in get_supported_languages():
+        raise ValueError("Unsupported language: {}".format(language))
+    spoken_language = positional[1] if len(positional) > 1 else None
+    if spoken_language is not None and spoken_language not in get_supported_spoken_languages():
+        raise ValueError("Unsupported spoken language: {}".format(spoken_language))
+    return content_type, language, period or default_period, spoken_language
+
+
+LANGUAGE_CODES = {}
+
+
+def get_language_code(name):
+    """
+    Get the URL code of a programming language from its display name, e.g. "C++" to "c++"
+    :param name: display name or code of the language
+    :return: language code, or an empty string when name is empty
+    """
+    if not name:
+        return ""
+    if not LANGUAGE_CODES:
+        for info in get_languages_json():
+            LANGUAGE_CODES[info["name"].lower()] = info["urlParam"]
+            LANGUAGE_CODES[info["urlParam"]] = info["urlParam"]
+    return LANGUAGE_CODES.get(name.lower(), name.lower())
+
+
+ARTICLE_TAG = re.compile(rb"<(/?)article\b[^>]*>", re.IGNORECASE)
+
+
+def get_article_slices(page_content, class_name):
+    """
+    Get the raw HTML of every top level article element with a class, without building a parse tree.
+    Nested articles are kept inside the slice of the article that contains them.
+    :param page_content: raw HTML of the page, as bytes
+    :param class_name: class the article element must have
+    :return: list of raw HTML slices in document order
+    """
+    class_name = class_name.encode("utf-8")
+    slices = []
+    depth = 0
+    start = None
+    for match in ARTICLE_TAG.finditer(page_content):
+        if match.group(1):
+            depth = max(depth - 1, 0)
+            if depth == 0 and start is not None:
+                slices.append(page_content[start:match.end()])
+                start = None
+        else:
+            if depth == 0 and class_name in match.group(0):
+                start = match.start()
+            depth += 1
+    return slices
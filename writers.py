@@ -0,0 +1,37 @@
+import csv
+import json
+
+from enums import Formats
+
+STREAMING_FORMATS = (Formats.NDJSON.value, Formats.CSV.value)
+
+
+class RecordWriter:
+    def __init__(self, format_, out, fieldnames):
+        """
+        Write trending records one at a time as NDJSON lines or CSV rows
+        :param format_: streaming output format to use
+        :param out: text stream to write to
+        :param fieldnames: CSV columns, in order
+        """
+        self.format = format_
+        self.out = out
+        self.csv_writer = None
+        if format_ == Formats.CSV:
+            self.csv_writer = csv.DictWriter(out, fieldnames=fieldnames, extrasaction="ignore")
+            self.csv_writer.writeheader()
+
+    def write(self, record):
+        """
+        Write a single record
+        :param record: flat dict of the record's fields
+        :return:
+        """
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(record)
+        else:
+            self.out.write(json.dumps(record, ensure_ascii=False))
+            self.out.write("\n")
+
+    def flush(self):
+        self.out.flush()